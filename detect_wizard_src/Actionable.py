@@ -103,6 +103,8 @@ def parse_cause_actions(cause_action_dict: dict, vars_dict: dict):
 
 
 def parse_and_replace_action_vars(action, vars_dict: dict):
+    if type(action) == tuple:
+        return tuple(parse_and_replace_action_vars(part, vars_dict) for part in action)
     if type(action) == str:
         action_vars = re.findall("\\${([a-zA-Z-0-9_]+)}", action)
         if action_vars is not None:
@@ -126,6 +128,12 @@ class Actionable(object):
         self.default = default_description
 
     def test(self, **vars_dict):
+        value_action = self.evaluate(**vars_dict)
+        Actionable.wl.log(topic=self.title, causes=value_action.causes, outcome=value_action.outcome, description=value_action.description)
+        return value_action
+
+    def evaluate(self, **vars_dict):
+        # Same as test() but without recording the outcome in the manifest (used for what-if analysis)
         output = parse_cause_actions(self.cause_action_dict, vars_dict)
         true_count = 0
         value_action = None
@@ -146,7 +154,6 @@ class Actionable(object):
                 failed_test_causes = failed_test_causes.union(set(v[1]))
         if true_count == 0:
             value_action = Actionable.Output("NO-OP", failed_test_causes, parse_and_replace_action_vars(self.default, vars_dict))
-        Actionable.wl.log(topic=self.title, causes=value_action.causes, outcome=value_action.outcome, description=value_action.description)
         return value_action
 
     def get_table(self, sensitivity_value):
@@ -0,0 +1,52 @@
+import gzip
+import json
+import os
+import tempfile
+from collections import Counter
+
+baseline_version = 4
+
+
+def open_baseline(fname, mode):
+    # Baselines are gzip compressed if the file name ends in .gz
+    if fname.endswith(".gz"):
+        return gzip.open(fname, mode + "t", encoding="utf-8")
+    return open(fname, mode, encoding="utf-8")
+
+
+def save_baseline(fname, state):
+    """
+    Save the scan state (a dict of the walk results) to fname as JSON, replacing any existing file atomically.
+    """
+    state = dict(state)
+    state['version'] = baseline_version
+    # Tuple keys are not valid JSON keys
+    state['inode_dict'] = [[dev, ino, paths] for (dev, ino), paths in state['inode_dict'].items()]
+
+    fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(fname)), prefix=".baseline-",
+                                   suffix=".gz" if fname.endswith(".gz") else "")
+    os.close(fd)
+    try:
+        with open_baseline(tmpname, "w") as b:
+            json.dump(state, b)
+        os.replace(tmpname, fname)
+    except BaseException:
+        os.remove(tmpname)
+        raise
+
+
+def load_baseline(fname):
+    """
+    Load a scan state saved by save_baseline(). Raises ValueError if the file is not a usable baseline.
+    """
+    with open_baseline(fname, "r") as b:
+        state = json.load(b)
+    if not isinstance(state, dict) or state.get('version') != baseline_version:
+        raise ValueError("Baseline file {} was not saved by this version".format(fname))
+    for ddict in state['dir_dict'].values():
+        if 'exts' in ddict:
+            ddict['exts'] = Counter(ddict['exts'])
+            ddict['ftypes'] = Counter(ddict['ftypes'])
+    state['inode_dict'] = {(dev, ino): paths for dev, ino, paths in state['inode_dict']}
+    state['largest_files'] = [tuple(item) for item in state['largest_files']]
+    return state
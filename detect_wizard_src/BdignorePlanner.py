@@ -0,0 +1,92 @@
+import heapq
+import os
+
+
+def entry_size(path, dir_dict, large_dict):
+    if path in dir_dict and 'size' in dir_dict[path]:
+        return dir_dict[path]['size']
+    return large_dict.get(path, 0)
+
+
+def plan_bdignores(paths, root, dir_dict, large_dict):
+    """
+    Compute the minimal set of ignore entries covering paths (folders or large files found by the scan).
+    Entries beneath another entry are dropped, and where every entry of a folder is covered the folder
+    replaces its entries (repeated up the tree, but never to the scan folder itself).
+    Returns a list of (path, size) where size is the scan bytes excluded by the entry.
+    """
+    root = os.path.normpath(root)
+
+    def is_top(path):
+        # Paths are built by joining names to the scan folder path, so only the scan folder needs normalising
+        return path == "" or path == os.path.dirname(path) or os.path.normpath(path) == root
+
+    covered = {p for p in paths if p.find("##") < 0 and not is_top(p)}
+
+    def has_covered_ancestor(path):
+        parent = os.path.dirname(path)
+        while not is_top(parent):
+            if parent in covered:
+                return True
+            parent = os.path.dirname(parent)
+        return False
+
+    covered = {p for p in covered if not has_covered_ancestor(p)}
+
+    # Covered entries grouped by folder, folders processed deepest first so that collapsing can cascade
+    children = {}
+    for path in covered:
+        children.setdefault(os.path.dirname(path), set()).add(path)
+    heap = [(-parent.count(os.sep), parent) for parent in children]
+    heapq.heapify(heap)
+    while heap:
+        depth, parent = heapq.heappop(heap)
+        if is_top(parent) or parent not in dir_dict:
+            continue
+        num_entries = dir_dict[parent].get('num_entries', 0)
+        if num_entries == 0 or len(children[parent]) < num_entries:
+            continue
+        covered -= children.pop(parent)
+        covered.add(parent)
+        grandparent = os.path.dirname(parent)
+        if grandparent not in children:
+            children[grandparent] = set()
+            heapq.heappush(heap, (-grandparent.count(os.sep), grandparent))
+        children[grandparent].add(parent)
+
+    return sorted(((path, entry_size(path, dir_dict, large_dict)) for path in covered),
+                  key=lambda p: (-p[1], p[0]))
+
+
+def write_bdignores(plan):
+    """
+    Add the planned entries to the .bdignore file in the folder containing each entry; each .bdignore file
+    is read and written once. Returns (number of files written, number of entries added, list of errors).
+    """
+    by_file = {}
+    for path, size in plan:
+        by_file.setdefault(os.path.join(os.path.dirname(path), ".bdignore"), []).append(
+            "/" + os.path.basename(path) + "/")
+
+    filecount = 0
+    entrycount = 0
+    errors = []
+    for bdignore_file, lines in sorted(by_file.items()):
+        try:
+            existing = set()
+            ends_with_newline = True
+            if os.path.exists(bdignore_file):
+                with open(bdignore_file, "r") as b:
+                    content = b.read()
+                existing = {line.strip() for line in content.splitlines()}
+                ends_with_newline = content == "" or content.endswith("\n")
+            new_lines = [line for line in lines if line not in existing]
+            if not new_lines:
+                continue
+            with open(bdignore_file, "a") as b:
+                b.write(("" if ends_with_newline else "\n") + "\n".join(new_lines) + "\n")
+            filecount += 1
+            entrycount += len(new_lines)
+        except Exception as e:
+            errors.append("Unable to update .bdignore file {}\n{}".format(bdignore_file, str(e)))
+    return filecount, entrycount, errors
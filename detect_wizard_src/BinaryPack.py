@@ -0,0 +1,350 @@
+import collections
+import concurrent.futures
+import glob
+import hashlib
+import os
+import shutil
+import struct
+import tempfile
+import zipfile
+import zlib
+
+# Formats which are already compressed (or are disk images of compressed content) are stored, not deflated
+stored_ext_list = ['.apk', '.ipa', '.aac', '.iso', '.qcow2', '.vmdk', '.vdi', '.ova', '.img', '.nbi', '.vib',
+                   '.zip', '.jar', '.war', '.ear', '.gz', '.tgz', '.xz', '.bz2', '.7z', '.rar', '.lz', '.zst',
+                   '.cab', '.msi', '.rpm', '.deb', '.jpg', '.png', '.mp3', '.mp4']
+
+buffersize = 1024 * 1024
+# Deflated entries are held in memory up to this size, larger ones are spooled to a temporary file
+spool_size = 1024 * 1024
+# Maximum total size of the files being deflated ahead of the writer
+pending_max_size = 256 * 1024 * 1024
+
+# Sizes and offsets from this value on need the zip64 extensions
+zip64_limit = 0xFFFFFFFF
+# General purpose flag - file names are utf-8
+utf8_flag = 0x800
+
+
+def hash_file(path):
+    # Returns (sha1 hex digest, size)
+    sha1 = hashlib.sha1()
+    size = 0
+    with open(path, 'rb') as bfile:
+        buffr = bfile.read(buffersize)
+        while buffr:
+            sha1.update(buffr)
+            size += len(buffr)
+            buffr = bfile.read(buffersize)
+    return sha1.hexdigest(), size
+
+
+def default_workers():
+    return min(32, (os.cpu_count() or 1) + 4)
+
+
+def hash_files(path_list, workers=None):
+    """
+    Hash the files in path_list in worker threads. Returns ({path: (sha1 hex digest, size)}, list of errors).
+    """
+    hashes = {}
+    errors = []
+
+    def try_hash(path):
+        try:
+            return hash_file(path)
+        except OSError as e:
+            errors.append("Unable to read binary file {} - {}".format(path, str(e)))
+            return None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers or default_workers()) as executor:
+        for path, result in zip(path_list, executor.map(try_hash, path_list)):
+            if result is not None:
+                hashes[path] = result
+    return hashes, errors
+
+
+def entry_overhead(name):
+    # Upper bound of the bytes added to a zip by the local and central directory headers of an entry
+    return 2 * (76 + len(name.encode('utf-8')))
+
+
+# Size of the end of central directory record, with the zip64 end record and locator
+end_overhead = 22 + 56 + 20
+
+
+def dos_date_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return ((year - 1980) << 9) | (month << 5) | day, (hour << 11) | (minute << 5) | (second // 2)
+
+
+class PackEntry(object):
+    """
+    A file prepared for the pack - data is the deflated content (a spooled temporary file), or None for a stored
+    entry which is copied from the file by the writer.
+    """
+
+    def __init__(self, path, zinfo, size, method, data=None, crc=0, compress_size=0):
+        self.path = path
+        self.zinfo = zinfo
+        self.size = size
+        self.method = method
+        self.data = data
+        self.crc = crc
+        self.compress_size = compress_size
+        self.offset = 0
+        # The header format is fixed when the local header is first written, so that it can be rewritten in place
+        self.zip64_header = None
+
+    def name(self):
+        return self.zinfo.filename.encode('utf-8')
+
+    def zip64(self):
+        return self.size >= zip64_limit or self.compress_size >= zip64_limit
+
+    def local_header(self):
+        date, time = dos_date_time(self.zinfo.date_time)
+        if self.zip64_header if self.zip64_header is not None else self.zip64():
+            extra = struct.pack('<2H2Q', 0x0001, 16, self.size, self.compress_size)
+            sizes = (0xFFFFFFFF, 0xFFFFFFFF)
+            version = 45
+        else:
+            extra = b''
+            sizes = (self.compress_size, self.size)
+            version = 20
+        return struct.pack('<4s5HL2L2H', b'PK\x03\x04', version, utf8_flag, self.method, time, date, self.crc,
+                           sizes[0], sizes[1], len(self.name()), len(extra)) + self.name() + extra
+
+    def central_header(self):
+        date, time = dos_date_time(self.zinfo.date_time)
+        # The zip64 extra field of the central directory only holds the values which do not fit
+        fields = []
+        size = self.size
+        compress_size = self.compress_size
+        offset = self.offset
+        if size >= zip64_limit:
+            fields.append(size)
+            size = 0xFFFFFFFF
+        if compress_size >= zip64_limit:
+            fields.append(compress_size)
+            compress_size = 0xFFFFFFFF
+        if offset >= zip64_limit:
+            fields.append(offset)
+            offset = 0xFFFFFFFF
+        extra = struct.pack('<2H{}Q'.format(len(fields)), 0x0001, 8 * len(fields), *fields) if fields else b''
+        version = 45 if fields or self.zip64_header else 20
+        return struct.pack('<4s2B5H3L5H2L', b'PK\x01\x02', version, 3, version, utf8_flag, self.method, time,
+                           date, self.crc, compress_size, size, len(self.name()), len(extra), 0, 0, 0,
+                           self.zinfo.external_attr, offset) + self.name() + extra
+
+
+class RawZipWriter(object):
+    """
+    Writes a zip archive of entries whose data has already been compressed, so that the deflate work can be
+    done by the worker threads and the writer only appends the results.
+    """
+
+    def __init__(self, path):
+        self.fp = open(path, 'wb')
+        self.entries = []
+
+    def add(self, entry):
+        if entry.data is None:
+            with open(entry.path, 'rb') as bfile:
+                self.write_header(entry)
+                self.copy_stored(entry, bfile)
+        else:
+            self.write_header(entry)
+            entry.data.seek(0)
+            shutil.copyfileobj(entry.data, self.fp, buffersize)
+        self.entries.append(entry)
+
+    def write_header(self, entry):
+        entry.offset = self.fp.tell()
+        entry.zip64_header = entry.zip64()
+        self.fp.write(entry.local_header())
+
+    def copy_stored(self, entry, bfile):
+        # The CRC of a stored entry is computed while copying, and the local header rewritten with it (and with
+        # the number of bytes copied, if the file shrank) - the header length does not change
+        crc = 0
+        copied = 0
+        while copied < entry.size:
+            buffr = bfile.read(min(buffersize, entry.size - copied))
+            if not buffr:
+                break
+            crc = zlib.crc32(buffr, crc)
+            self.fp.write(buffr)
+            copied += len(buffr)
+        end = self.fp.tell()
+        entry.crc = crc
+        entry.size = copied
+        entry.compress_size = copied
+        self.fp.seek(entry.offset)
+        self.fp.write(entry.local_header())
+        self.fp.seek(end)
+
+    def size(self):
+        return self.fp.tell()
+
+    def close(self):
+        cd_offset = self.fp.tell()
+        for entry in self.entries:
+            self.fp.write(entry.central_header())
+        cd_size = self.fp.tell() - cd_offset
+        count = len(self.entries)
+        if count >= 0xFFFF or cd_offset >= zip64_limit or cd_size >= zip64_limit:
+            eocd64_offset = self.fp.tell()
+            self.fp.write(struct.pack('<4sQ2H2L4Q', b'PK\x06\x06', 44, 45, 45, 0, 0, count, count, cd_size,
+                                      cd_offset))
+            self.fp.write(struct.pack('<4sLQL', b'PK\x06\x07', 0, eocd64_offset, 1))
+            count = min(count, 0xFFFF)
+            cd_size = min(cd_size, 0xFFFFFFFF)
+            cd_offset = min(cd_offset, 0xFFFFFFFF)
+        self.fp.write(struct.pack('<4s4H2LH', b'PK\x05\x06', 0, 0, count, count, cd_size, cd_offset, 0))
+        self.fp.close()
+
+
+class BinaryPack(object):
+    """
+    Builds the zip archive(s) of binary files uploaded for BDBA binary scan.
+
+    Files are deduplicated by content hash and deflated in worker threads (already-compressed formats are stored
+    rather than deflated), a single writer appends the entries in a deterministic order, and the pack can be split
+    into volumes of at most volume_size bytes (a new volume is started when the next entry does not fit).
+    """
+
+    def __init__(self, folder, fname="binary_files.zip", volume_size=0, workers=None):
+        self.folder = folder
+        self.fname = fname
+        self.volume_size = volume_size
+        self.workers = workers or default_workers()
+        self.volumes = []
+        self.num_files = 0
+        self.num_dups = 0
+        self.dup_size = 0
+        self.input_size = 0
+        self.output_size = 0
+        self.errors = []
+
+    def volume_name(self, num):
+        base, ext = os.path.splitext(self.fname)
+        return "{}_{}{}".format(base, num, ext)
+
+    def volume_pattern(self):
+        base, ext = os.path.splitext(self.fname)
+        return "{}_*{}".format(base, ext)
+
+    def pack(self, path_list, hashes=None):
+        """
+        Pack the files in path_list and return the list of volume file names (relative to folder). hashes holds
+        the (sha1 hex digest, size) of files already hashed (for example by the binary triage), which are not
+        read again to find the duplicates.
+        """
+        # Remove volumes left by a previous run so that the volume name pattern only matches this pack
+        for vol in glob.glob(os.path.join(glob.escape(self.folder), self.volume_pattern())):
+            os.remove(vol)
+
+        unique = self.dedup(sorted(path_list), hashes or {})
+
+        zw = None
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as executor:
+                # Files are deflated by the workers, and appended in path order by this thread - the work pending
+                # is bounded so that the spooled compressed data does not pile up in temporary files
+                pending = collections.deque()
+                pending_size = 0
+                for bin_path, size in unique:
+                    while pending and (len(pending) >= 2 * self.workers or pending_size + size > pending_max_size):
+                        future, done_size = pending.popleft()
+                        zw = self.write_entry(zw, future.result())
+                        pending_size -= done_size
+                    pending.append((executor.submit(self.prepare_entry, bin_path, size), size))
+                    pending_size += size
+                while pending:
+                    zw = self.write_entry(zw, pending.popleft()[0].result())
+        finally:
+            if zw is not None:
+                zw.close()
+
+        if len(self.volumes) == 1:
+            # A single volume keeps the plain pack name
+            os.replace(os.path.join(self.folder, self.volumes[0]), os.path.join(self.folder, self.fname))
+            self.volumes = [self.fname]
+        for vol in self.volumes:
+            self.output_size += os.path.getsize(os.path.join(self.folder, vol))
+        return self.volumes
+
+    def dedup(self, path_list, hashes):
+        unique = []
+        seen = set()
+        new_hashes, errors = hash_files([path for path in path_list if path not in hashes], self.workers)
+        self.errors += errors
+        for bin_path in path_list:
+            result = hashes.get(bin_path) or new_hashes.get(bin_path)
+            if result is None:
+                continue
+            digest, size = result
+            self.input_size += size
+            if digest in seen:
+                self.num_dups += 1
+                self.dup_size += size
+                continue
+            seen.add(digest)
+            unique.append((bin_path, size))
+        return unique
+
+    def prepare_entry(self, bin_path, size):
+        # Runs in a worker thread - exactly size bytes (the size when the file was hashed) are deflated, so a file
+        # which grows while the pack is built cannot overrun the volume; a file which shrinks is reported
+        name = os.path.relpath(bin_path, self.folder)
+        try:
+            zinfo = zipfile.ZipInfo.from_file(bin_path, name, strict_timestamps=False)
+            if os.path.splitext(bin_path)[1].lower() in stored_ext_list:
+                return PackEntry(bin_path, zinfo, size, zipfile.ZIP_STORED, compress_size=size)
+            data = tempfile.SpooledTemporaryFile(max_size=spool_size)
+            compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+            crc = 0
+            remaining = size
+            with open(bin_path, 'rb') as bfile:
+                while remaining > 0:
+                    buffr = bfile.read(min(buffersize, remaining))
+                    if not buffr:
+                        break
+                    crc = zlib.crc32(buffr, crc)
+                    data.write(compressor.compress(buffr))
+                    remaining -= len(buffr)
+            data.write(compressor.flush())
+        except OSError as e:
+            self.errors.append("Unable to read binary file {} - {}".format(bin_path, str(e)))
+            return None
+        self.check_size(bin_path, size - remaining, size)
+        return PackEntry(bin_path, zinfo, size - remaining, zipfile.ZIP_DEFLATED, data, crc, data.tell())
+
+    def write_entry(self, zw, entry):
+        # Runs in the writer thread - a new volume is started when the entry does not fit in the current one
+        if entry is None:
+            return zw
+        size = entry.size
+        entry_size = entry.compress_size + entry_overhead(entry.zinfo.filename)
+        if zw is None or (self.volume_size > 0 and zw.entries and zw.size() + entry_size + end_overhead > self.volume_size):
+            if zw is not None:
+                zw.close()
+            self.volumes.append(self.volume_name(len(self.volumes) + 1))
+            zw = RawZipWriter(os.path.join(self.folder, self.volumes[-1]))
+        try:
+            zw.add(entry)
+        except OSError as e:
+            self.errors.append("Unable to read binary file {} - {}".format(entry.path, str(e)))
+            return zw
+        finally:
+            if entry.data is not None:
+                entry.data.close()
+        self.check_size(entry.path, entry.size, size)
+        self.num_files += 1
+        return zw
+
+    def check_size(self, bin_path, packed, size):
+        if packed < size:
+            self.errors.append("Binary file {} changed while being packed - {:,d} of {:,d} bytes packed".format(
+                bin_path, packed, size))
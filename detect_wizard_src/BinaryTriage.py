@@ -0,0 +1,225 @@
+import os
+import struct
+
+# Object files and static libraries - BDBA identifies components from linked binaries, not from these
+object_ext_list = ['.o', '.obj', '.a', '.lib']
+
+elf_machines = {3: 'x86', 8: 'mips', 20: 'ppc', 21: 'ppc64', 40: 'arm', 42: 'sh', 43: 'sparcv9', 50: 'ia64',
+                62: 'x86_64', 183: 'aarch64', 243: 'riscv'}
+pe_machines = {0x14c: 'x86', 0x8664: 'x86_64', 0x1c0: 'arm', 0x1c4: 'arm', 0xaa64: 'aarch64', 0x200: 'ia64'}
+macho_cputypes = {7: 'x86', 0x01000007: 'x86_64', 12: 'arm', 0x0100000c: 'aarch64', 18: 'ppc', 0x01000012: 'ppc64'}
+
+# Limit on the size of the sections read for build ids and version strings
+max_section_read = 65536
+
+
+class BinaryInfo(object):
+    """
+    Header information for a binary file. Only the file headers, section/load command tables and small
+    note/comment sections are read.
+    """
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.format = 'unknown'
+        self.arch = ''
+        self.kind = ''          # exe, shared, object, archive
+        self.linkage = ''       # static or dynamic
+        self.stripped = None
+        self.build_id = ''
+        self.versions = []
+        self.content_hash = None    # Set by the caller for binaries without a build id
+
+    @property
+    def score(self):
+        # Analysis value for BDBA - 0 for object files and static libraries
+        if self.kind in ['object', 'archive'] or (self.kind == '' and
+                                                  os.path.splitext(self.path)[1].lower() in object_ext_list):
+            return 0
+        if self.format == 'unknown':
+            # Images, packages and installers - BDBA unpacks these
+            return 2
+        score = 3
+        if self.versions or self.stripped is False:
+            score += 1
+        return score
+
+    @property
+    def build_key(self):
+        # Binaries with the same key are treated as the same build - without a build id only identical
+        # content is (a binary whose content is not known is never treated as a duplicate)
+        if self.build_id:
+            return self.format, self.arch, self.build_id
+        if self.content_hash:
+            return 'content', self.content_hash
+        return 'path', self.path
+
+
+def read_at(f, offset, length):
+    f.seek(offset)
+    return f.read(length)
+
+
+def parse_elf(f, info):
+    ident = read_at(f, 0, 64)
+    is64 = ident[4] == 2
+    endian = '<' if ident[5] == 1 else '>'
+    info.format = 'ELF'
+    if is64:
+        (e_type, e_machine, _, _, e_phoff, e_shoff, _, _, e_phentsize, e_phnum, e_shentsize, e_shnum,
+         e_shstrndx) = struct.unpack(endian + 'HHIQQQIHHHHHH', ident[16:64])
+    else:
+        (e_type, e_machine, _, _, e_phoff, e_shoff, _, _, e_phentsize, e_phnum, e_shentsize, e_shnum,
+         e_shstrndx) = struct.unpack(endian + 'HHIIIIIHHHHHH', ident[16:52])
+    info.arch = elf_machines.get(e_machine, str(e_machine))
+    info.kind = {1: 'object', 2: 'exe', 3: 'shared'}.get(e_type, '')
+
+    if e_phnum and e_phentsize:
+        phdrs = read_at(f, e_phoff, e_phnum * e_phentsize)
+        p_types = [struct.unpack_from(endian + 'I', phdrs, i * e_phentsize)[0] for i in range(e_phnum)
+                   if (i + 1) * e_phentsize <= len(phdrs)]
+        # PT_DYNAMIC or PT_INTERP
+        info.linkage = 'dynamic' if 2 in p_types or 3 in p_types else 'static'
+        if e_type == 3 and 3 in p_types:
+            # Position independent executable
+            info.kind = 'exe'
+
+    if not e_shnum or not e_shentsize or e_shstrndx >= e_shnum:
+        return
+    shdrs = read_at(f, e_shoff, e_shnum * e_shentsize)
+    sections = []
+    for i in range(e_shnum):
+        if (i + 1) * e_shentsize > len(shdrs):
+            break
+        if is64:
+            name, stype, _, _, offset, size = struct.unpack_from(endian + 'IIQQQQ', shdrs, i * e_shentsize)
+        else:
+            name, stype, _, _, offset, size = struct.unpack_from(endian + 'IIIIII', shdrs, i * e_shentsize)
+        sections.append((name, stype, offset, size))
+    if e_shstrndx >= len(sections):
+        return
+    strtab = read_at(f, sections[e_shstrndx][2], min(sections[e_shstrndx][3], max_section_read))
+
+    def section_name(offset):
+        end = strtab.find(b'\0', offset)
+        return strtab[offset:end].decode('ascii', 'replace')
+
+    names = {}
+    for name, stype, offset, size in sections:
+        names[section_name(name)] = (stype, offset, size)
+    info.stripped = '.symtab' not in names
+    if '.note.gnu.build-id' in names:
+        stype, offset, size = names['.note.gnu.build-id']
+        note = read_at(f, offset, min(size, 256))
+        if len(note) >= 12:
+            namesz, descsz, _ = struct.unpack_from(endian + 'III', note)
+            desc_off = 12 + ((namesz + 3) & ~3)
+            info.build_id = note[desc_off:desc_off + descsz].hex()
+    if '.comment' in names:
+        stype, offset, size = names['.comment']
+        info.versions = sorted({v.decode('ascii', 'replace').strip() for v in
+                                read_at(f, offset, min(size, max_section_read)).split(b'\0') if v.strip()})
+
+
+def parse_pe(f, info):
+    header = read_at(f, 0, 64)
+    pe_offset = struct.unpack_from('<I', header, 0x3c)[0]
+    coff = read_at(f, pe_offset, 24 + 2)
+    if coff[:4] != b'PE\0\0':
+        return
+    machine, _, _, symtab_ptr, num_symbols, _, characteristics = struct.unpack_from('<HHIIIHH', coff, 4)
+    info.format = 'PE'
+    info.arch = pe_machines.get(machine, hex(machine))
+    info.kind = 'shared' if characteristics & 0x2000 else 'exe'
+    info.linkage = 'dynamic'
+    # IMAGE_FILE_DEBUG_STRIPPED or no COFF symbol table
+    info.stripped = bool(characteristics & 0x200) or num_symbols == 0
+
+
+def parse_macho(f, info, magic):
+    is64 = magic in [0xfeedfacf, 0xcffaedfe]
+    endian = '>' if magic in [0xfeedface, 0xfeedfacf] else '<'
+    header = read_at(f, 0, 32 if is64 else 28)
+    _, cputype, _, filetype, ncmds, sizeofcmds, _ = struct.unpack_from(endian + 'IiIIIII', header)
+    info.format = 'Mach-O'
+    info.arch = macho_cputypes.get(cputype & 0xffffffff, str(cputype))
+    info.kind = {1: 'object', 2: 'exe', 6: 'shared', 8: 'shared'}.get(filetype, '')
+    info.linkage = 'static'
+    cmds = read_at(f, len(header), min(sizeofcmds, max_section_read))
+    offset = 0
+    for _ in range(ncmds):
+        if offset + 8 > len(cmds):
+            break
+        cmd, cmdsize = struct.unpack_from(endian + 'II', cmds, offset)
+        if cmd == 0x1b:
+            # LC_UUID
+            info.build_id = cmds[offset + 8:offset + 24].hex()
+        elif cmd in [0xc, 0x80000018, 0x8000001f]:
+            # LC_LOAD_DYLIB, LC_LOAD_WEAK_DYLIB, LC_REEXPORT_DYLIB
+            info.linkage = 'dynamic'
+        elif cmd == 0x2:
+            # LC_SYMTAB - nsyms
+            info.stripped = struct.unpack_from(endian + 'I', cmds, offset + 12)[0] == 0
+        if cmdsize == 0:
+            break
+        offset += cmdsize
+
+
+def triage(path):
+    """
+    Return a BinaryInfo for path. Files which cannot be read or parsed are returned with format 'unknown'.
+    """
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    info = BinaryInfo(path, size)
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(8)
+            if head[:4] == b'\x7fELF':
+                parse_elf(f, info)
+            elif head[:2] == b'MZ':
+                parse_pe(f, info)
+            elif head == b'!<arch>\n':
+                info.format = 'ar'
+                info.kind = 'archive'
+            elif len(head) >= 4 and struct.unpack('>I', head[:4])[0] in [0xfeedface, 0xfeedfacf, 0xcefaedfe,
+                                                                           0xcffaedfe]:
+                parse_macho(f, info, struct.unpack('>I', head[:4])[0])
+            elif head[:4] == b'\xca\xfe\xba\xbe' and struct.unpack('>I', head[4:8])[0] < 20:
+                # Universal binary (the small architecture count distinguishes it from a Java class file)
+                info.format = 'Mach-O'
+                info.arch = 'universal'
+                info.kind = 'exe'
+    except (OSError, struct.error, IndexError, ValueError):
+        pass
+    return info
+
+
+def select(infos, budget=0):
+    """
+    Rank binaries by analysis value and choose those sent to BDBA. One binary is kept from each group of
+    identical builds (same build id, or same content_hash for binaries without one) and binaries with no analysis value are dropped; with a budget (bytes), binaries are
+    then taken in rank order (smaller first within a rank) while they fit.
+    Returns (selected infos, number of identical builds skipped, number with no value skipped, number over budget).
+    """
+    groups = {}
+    for info in infos:
+        groups.setdefault(info.build_key, []).append(info)
+    num_identical = len(infos) - len(groups)
+    candidates = [min(group, key=lambda i: (-i.score, i.path)) for group in groups.values()]
+
+    ranked = sorted((i for i in candidates if i.score > 0), key=lambda i: (-i.score, i.size, i.path))
+    num_novalue = len(candidates) - len(ranked)
+    if budget <= 0:
+        return ranked, num_identical, num_novalue, 0
+
+    selected = []
+    total = 0
+    for info in ranked:
+        if total + info.size <= budget:
+            selected.append(info)
+            total += info.size
+    return selected, num_identical, num_novalue, len(ranked) - len(selected)
@@ -1,7 +1,19 @@
+import hashlib
+import os
 import re
+import tempfile
 from collections import OrderedDict
 
 
+# Preamble comment listing hashes of the lines the wizard wrote, so that a later run can tell them from lines
+# added or edited by hand
+generated_marker = "# detect_wizard generated lines (lines added or edited by hand are kept):"
+
+
+def line_hash(line):
+    return hashlib.sha1(line.strip().encode("utf-8")).hexdigest()[:8]
+
+
 class Property(object):
     @staticmethod
     def parse(property_str: str, position=None):
@@ -25,6 +37,7 @@ class Property(object):
         self.value = property_value
         self.property_key = "{}:{}".format(self.position, self.property_name)
         self.is_commented = is_commented
+        self.loaded = False
 
     def __str__(self):
         return ("# " if self.is_commented else "") + str(self.property_name) + ": " + str(self.value)
@@ -36,6 +49,41 @@ class Property(object):
         return "({}): \"{}\"".format(self.position, self.__str__())
 
 
+class PropertyIndex(object):
+    """
+    Global property name -> PropertyGroup(s) index shared by all the groups of a Configuration.
+    Where a property name is defined in more than one group, the first group (in config order) wins.
+    """
+    def __init__(self):
+        self._groups = dict()
+
+    def add(self, property_name, group):
+        groups = self._groups.setdefault(property_name, [])
+        if group not in groups:
+            groups.append(group)
+            if len(groups) > 1:
+                groups.sort(key=lambda g: g.order)
+
+    def remove(self, property_name, group):
+        groups = self._groups.get(property_name)
+        if groups is not None and group in groups:
+            groups.remove(group)
+            if not groups:
+                del self._groups[property_name]
+
+    def get(self, property_name):
+        groups = self._groups.get(property_name)
+        if groups:
+            return groups[0].properties_dict[property_name]
+        return None
+
+    def items(self):
+        return self._groups.items()
+
+    def __contains__(self, property_name):
+        return property_name in self._groups
+
+
 class PropertyGroup(object):
     @staticmethod
     def look_for_group_def_title(line_str: str):
@@ -52,7 +100,13 @@ class PropertyGroup(object):
         self.title = title
         self.line_no_offset = None
         self.defaults = defaults
+        self.order = 0
+        self.prop_index = None
         self.line_objects = ["#    {}:".format(self.title), "#    "]
+        self.line_index = dict()
+        self.comment_lines = {"#    "}
+        # Comment lines read from an existing config file which the wizard did not write
+        self.loaded_comments = set()
         self.properties_dict = OrderedDict()
         if defaults is not None:
             for l_o in defaults.split('\n'):
@@ -65,19 +119,75 @@ class PropertyGroup(object):
     def add_property(self, prop: Property, should_update=False):
         if prop.property_name not in self.properties_dict:
             self.properties_dict[prop.property_name] = prop
+            self.line_index[prop.property_name] = len(self.line_objects)
             self.line_objects.append(prop)
-        elif should_update:
-            i = self.line_objects.index(self.properties_dict[prop.property_name])
-            self.line_objects.pop(i)
-            self.line_objects.insert(i, prop)
-            self.properties_dict[prop.property_name] = prop
+            if self.prop_index is not None:
+                self.prop_index.add(prop.property_name, self)
+        else:
+            existing = self.properties_dict[prop.property_name]
+            if existing.loaded and not prop.loaded and str(existing) == str(prop):
+                # Read from the file but identical to what the wizard generates - owned by the wizard from now on
+                existing.loaded = False
+            elif should_update or (existing.loaded and existing.is_commented and not prop.loaded):
+                # A commented-out entry read from the file is replaced by the value the wizard now generates
+                self.line_objects[self.line_index[prop.property_name]] = prop
+                self.properties_dict[prop.property_name] = prop
+
+    def merge_lines(self, lines, generated=()):
+        """
+        Merge lines read from an existing config file into this group, keeping their relative order.
+        Properties read from the file replace the generated defaults, and user comments are retained. Lines
+        whose hash is in generated were written by the wizard in an earlier run and are not kept (they are
+        generated again if they still apply).
+        """
+        cursor = 1
+        for line in lines:
+            # Properties are always written in YAML form - CLI style (--name=value) lines are comments
+            prop = Property.parse(line) if not re.match(r"\s*#?\s*--", line) else None
+            if prop is not None:
+                prop.loaded = True
+                if line_hash(str(prop)) in generated:
+                    if prop.property_name in self.properties_dict:
+                        cursor = self.line_objects.index(self.properties_dict[prop.property_name])
+                    continue
+                if prop.property_name in self.properties_dict:
+                    cursor = self.line_objects.index(self.properties_dict[prop.property_name])
+                    self.line_objects[cursor] = prop
+                    self.properties_dict[prop.property_name] = prop
+                else:
+                    cursor += 1
+                    self.line_objects.insert(cursor, prop)
+                    self.properties_dict[prop.property_name] = prop
+                    if self.prop_index is not None:
+                        self.prop_index.add(prop.property_name, self)
+            else:
+                if not line.startswith("#"):
+                    line = "#" + line
+                comment = re.sub(r'#\s*', "#    ", line)
+                if self.title in comment:
+                    continue
+                if line_hash(comment) in generated and comment not in self.comment_lines:
+                    continue
+                if comment in self.comment_lines:
+                    try:
+                        cursor = self.line_objects.index(comment, cursor)
+                    except ValueError:
+                        pass
+                else:
+                    cursor += 1
+                    self.line_objects.insert(cursor, comment)
+                    self.comment_lines.add(comment)
+                    self.loaded_comments.add(comment)
+        self.line_index = {l_o.property_name: i for i, l_o in enumerate(self.line_objects)
+                           if isinstance(l_o, Property)}
 
     def add_comment_line(self, comment: str):
         if not comment.startswith("#"):
             comment = "#" + comment
         comment = re.sub(r'#\s*', "#    ", comment)
         comment.replace("\n", "")
-        if comment not in self.line_objects and self.title not in comment:
+        if comment not in self.comment_lines and self.title not in comment:
+            self.comment_lines.add(comment)
             self.line_objects.append(comment)
 
     def get_line(self, num, strip_comment=True):
@@ -87,7 +197,17 @@ class PropertyGroup(object):
         return line
 
     def clear(self, with_defaults=True):
+        # Values set by hand and user comments in an existing config file survive clearing the group (lines the
+        # wizard wrote in an earlier run are not loaded, so they are dropped unless generated again)
+        kept = [l_o for l_o in self.line_objects
+                if (isinstance(l_o, Property) and l_o.loaded and not l_o.is_commented) or
+                (not isinstance(l_o, Property) and l_o in self.loaded_comments)]
+        if self.prop_index is not None:
+            for property_name in self.properties_dict:
+                self.prop_index.remove(property_name, self)
         self.line_objects = ["#    {}:".format(self.title), "#    "]
+        self.line_index = dict()
+        self.comment_lines = {"#    "}
         self.properties_dict = OrderedDict()
         if self.defaults is not None:
             for l_o in self.defaults.split('\n'):
@@ -96,50 +216,78 @@ class PropertyGroup(object):
                     self.add_property(result)
                 else:
                     self.add_comment_line(l_o)
+        for l_o in kept:
+            if isinstance(l_o, Property):
+                self.add_property(l_o, should_update=True)
+            elif l_o not in self.comment_lines:
+                self.comment_lines.add(l_o)
+                self.line_objects.append(l_o)
 
     def __len__(self):
         return len(self.line_objects)
 
-    def __str__(self):
-        out_str = ""
+    def render_lines(self):
+        for l_o in self.line_objects:
+            yield "{}\n".format(str(l_o))
+
+    def generated_hashes(self):
+        # Hashes of the lines of the group written by the wizard (not read from the file)
         for l_o in self.line_objects:
-            out_str += "{}\n".format(str(l_o))
+            if isinstance(l_o, Property):
+                if not l_o.loaded:
+                    yield line_hash(str(l_o))
+            elif l_o not in self.loaded_comments:
+                yield line_hash(l_o)
 
-        return out_str
+    def __str__(self):
+        return "".join(self.render_lines())
 
 
 class Configuration(object):
 
     def __init__(self, filename, config_groups):
         self.filename = filename
-        self.file = None
+        self.file_content = None
+        self.preamble = []
         self.property_groups = OrderedDict()
         self.property_groups_title = OrderedDict()
-        for pg in config_groups:
+        self.prop_index = PropertyIndex()
+        for order, pg in enumerate(config_groups):
             self.property_groups[pg.key] = pg
             self.property_groups_title[pg.title] = self.property_groups[pg.key]
-  #      try:
- #           self.file = open(self.filename, 'r')
- #           current_key = None
-#
-  #          for (i, line) in enumerate(self.file.readlines()):
-  #              line = line[0:len(line)-1]
-  #              potential_prop_grp = PropertyGroup.look_for_group_def_title(line)
- #               # See if we've switched property groups (by title)
-  #              if potential_prop_grp in self.property_groups_title:
- #                   current_key = self.property_groups_title[potential_prop_grp].key
- #                   self.property_groups[current_key].line_no_offset = i # set the offset in the original config to where we are now
-#
- #               if current_key is not None:
- #                   if (result := Property.parse(line)) is not None:
-#                        # Add legit property
- #                       self.property_groups[current_key].add_property(result, should_update=True)
-  #                  else:
-#                       # add a comment line
- #                       self.property_groups[current_key].add_comment_line(line)
-#
-        #except FileNotFoundError:
-        self.file = open(self.filename, 'w')
+            pg.order = order
+            pg.prop_index = self.prop_index
+            for property_name in pg.properties_dict:
+                self.prop_index.add(property_name, pg)
+        if os.path.isfile(self.filename):
+            self.load()
+
+    def load(self):
+        # Parse an existing config file into the property groups (by group title)
+        with open(self.filename, 'r') as f:
+            self.file_content = f.read()
+
+        group_lines = OrderedDict()
+        current_key = None
+        generated = set()
+        for line in self.file_content.splitlines():
+            if line.startswith(generated_marker):
+                generated = set(line[len(generated_marker):].split())
+                continue
+            potential_prop_grp = PropertyGroup.look_for_group_def_title(line)
+            # See if we've switched property groups (by title)
+            if potential_prop_grp in self.property_groups_title:
+                current_key = self.property_groups_title[potential_prop_grp].key
+                group_lines[current_key] = []
+                continue
+            if current_key is None:
+                if line.strip():
+                    self.preamble.append(line)
+            else:
+                group_lines[current_key].append(line)
+
+        for key, lines in group_lines.items():
+            self.property_groups[key].merge_lines(lines, generated)
 
     def str_add(self, property_class, property_str, is_commented=False, should_update=False):
         property = Property.parse(property_str)
@@ -155,25 +303,17 @@ class Configuration(object):
         self.property_groups[property_class].add_property(property)
 
     def has_prop(self, property_name):
-        for v in self.property_groups.values():
-            for p in v.properties_dict.values():
-                if p.property_name is not None and p.property_name == property_name:
-                    return True
-        return False
+        return property_name in self.prop_index
 
     def get_prop(self, property_name):
-        for v in self.property_groups.values():
-            for p in v.properties_dict.values():
-                if p.property_name is not None and p.property_name == property_name:
-                    return p
-        return None
+        return self.prop_index.get(property_name)
 
     def get_props_like(self, property_name_expr):
         prop_list = []
-        for v in self.property_groups.values():
-            for p in v.properties_dict.values():
-                if p.property_name is not None and property_name_expr in p.property_name:
-                    prop_list.append(p)
+        for property_name, groups in self.prop_index.items():
+            if property_name_expr in property_name:
+                for pg in groups:
+                    prop_list.append(pg.properties_dict[property_name])
         return prop_list
 
     def uncomment_property(self, property_name, assert_value=None):
@@ -198,10 +338,50 @@ class Configuration(object):
     def get_lines(self):
         lines = []
         for pg in self.property_groups.values():
-            for l_o in pg.line_objects:
-                lines.append("{}\n".format(l_o))
+            lines.extend(pg.render_lines())
         return lines
 
+    def render_lines(self):
+        generated = []
+        for pg in self.property_groups.values():
+            for digest in pg.generated_hashes():
+                if digest not in generated:
+                    generated.append(digest)
+        yield "{} {}\n".format(generated_marker, " ".join(generated))
+        for line in self.preamble:
+            yield "{}\n".format(line)
+        for pg in self.property_groups.values():
+            yield from pg.render_lines()
+            yield "\n"
+
+    def write(self, filename=None):
+        # Write the config to a temporary file alongside the target and then replace it atomically.
+        # The file is left untouched (and False returned) if the content has not changed.
+        if filename is None:
+            filename = self.filename
+        content = str(self)
+        if filename == self.filename and content == self.file_content:
+            return False
+        fd, tmp_name = tempfile.mkstemp(prefix=".{}.".format(os.path.basename(filename)),
+                                        dir=os.path.dirname(os.path.abspath(filename)))
+        try:
+            try:
+                mode = os.stat(filename).st_mode & 0o777
+            except FileNotFoundError:
+                umask = os.umask(0)
+                os.umask(umask)
+                mode = 0o666 & ~umask
+            os.chmod(tmp_name, mode)
+            with os.fdopen(fd, 'w') as tmp_file:
+                tmp_file.write(content)
+            os.replace(tmp_name, filename)
+        except BaseException:
+            os.remove(tmp_name)
+            raise
+        if filename == self.filename:
+            self.file_content = content
+        return True
+
     def __contains__(self, item):
         return self.has_prop(item)
 
@@ -217,11 +397,7 @@ class Configuration(object):
         return outstr
 
     def __str__(self):
-        outstr = ""
-        for _, pg in self.property_groups.items():
-            #if pg.num_defined > 0:
-            outstr += "{}\n".format(str(pg))
-        return outstr
+        return "".join(self.render_lines())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,120 @@
+import json
+import os
+import tempfile
+import time
+from collections import Counter
+
+
+class ContentCache(object):
+    """
+    Cache of file classification results (magic MIME type, CRC and archive summaries) in a folder which can be
+    shared by all projects scanned on a host. Records are keyed by content (size and blob id) so identical files
+    in different projects share a record. Each record is a separate file replaced atomically, so several
+    processes can use the cache at the same time without locking.
+    """
+
+    def __init__(self, folder, max_size, max_age):
+        self.folder = folder
+        self.max_size = max_size
+        self.max_age = max_age
+        # Records read or written in this run
+        self.records = {}
+        self.hits = Counter()
+        self.misses = Counter()
+        os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def key(size, blob_id):
+        return "{}-{}".format(size, blob_id)
+
+    def record_path(self, key):
+        # Records are spread over 256 sub-folders by the first 2 characters of the blob id
+        return os.path.join(self.folder, key.split('-')[-1][:2], key + ".json")
+
+    def read_record(self, key):
+        if key not in self.records:
+            path = self.record_path(key)
+            try:
+                with open(path, "r") as r:
+                    self.records[key] = json.load(r)
+                # Records are aged from their last use
+                os.utime(path)
+            except (OSError, ValueError):
+                self.records[key] = {}
+        return self.records[key]
+
+    def get(self, key, kind):
+        """
+        Return the cached value of kind for key, or None.
+        """
+        value = self.read_record(key).get(kind)
+        if value is None:
+            self.misses[kind] += 1
+        else:
+            self.hits[kind] += 1
+        return value
+
+    def put(self, key, kind, value):
+        record = self.read_record(key)
+        record[kind] = value
+        path = self.record_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            with os.fdopen(fd, "w") as r:
+                json.dump(record, r)
+            os.replace(tmpname, path)
+        except OSError:
+            # The cache is an optimisation only - a record which cannot be written is not an error
+            pass
+
+    def evict(self):
+        """
+        Remove records not used for max_age seconds, then the least recently used records until the cache is
+        no larger than max_size bytes. Returns the number of records removed.
+        """
+        now = time.time()
+        records = []
+        removed = 0
+        total = 0
+        for shard in os.scandir(self.folder):
+            if not shard.is_dir(follow_symlinks=False):
+                continue
+            for entry in os.scandir(shard.path):
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                if entry.name.startswith(".tmp-"):
+                    # Left by a process which was interrupted while writing
+                    if now - st.st_mtime > 3600:
+                        removed += self.remove(entry.path)
+                elif now - st.st_mtime > self.max_age:
+                    removed += self.remove(entry.path)
+                else:
+                    records.append((st.st_mtime, st.st_size, entry.path))
+                    total += st.st_size
+        if total > self.max_size:
+            for mtime, size, path in sorted(records):
+                removed += self.remove(path)
+                total -= size
+                if total <= self.max_size:
+                    break
+        return removed
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+            return 1
+        except OSError:
+            # Already removed by another process
+            return 0
+
+    def stats(self):
+        # Hit rates by kind for the run summary
+        items = []
+        for kind in sorted(set(self.hits) | set(self.misses)):
+            lookups = self.hits[kind] + self.misses[kind]
+            items.append("{} {}/{} ({}%)".format(kind, self.hits[kind], lookups, 100 * self.hits[kind] // lookups))
+        return ", ".join(items) if items else "not used"
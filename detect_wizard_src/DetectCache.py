@@ -0,0 +1,84 @@
+import hashlib
+import os
+import shutil
+import tempfile
+import urllib.request
+
+
+class DetectCache(object):
+    """
+    Local cache of Synopsys Detect jars by version, so that Detect can be run directly with java without
+    downloading the launcher script and checking for a new jar on every run (or from a host without access to
+    the Synopsys servers once the cache is filled). The repository holds the jars as
+    <version>/synopsys-detect-<version>.jar with a .sha256 checksum file, and can be any http(s) or file URL
+    with that layout, for example a local mirror. Each jar is stored with its published checksum and is checked
+    against it before use.
+    """
+
+    def __init__(self, folder, base_url):
+        self.folder = folder
+        self.base_url = base_url.rstrip('/')
+        os.makedirs(folder, exist_ok=True)
+
+    @staticmethod
+    def jar_name(version):
+        return "synopsys-detect-{}.jar".format(version)
+
+    def jar_path(self, version):
+        return os.path.join(self.folder, self.jar_name(version))
+
+    def jar_url(self, version):
+        return "{}/{}/{}".format(self.base_url, version, self.jar_name(version))
+
+    @staticmethod
+    def sha256(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def verify(self, version):
+        # True if the cached jar for version exists and matches its recorded checksum
+        try:
+            with open(self.jar_path(version) + ".sha256", "r") as f:
+                expected = f.read().split()[0].lower()
+            return self.sha256(self.jar_path(version)) == expected
+        except (OSError, IndexError):
+            return False
+
+    def fetch(self, url, path):
+        # Download url to path - written to a temporary file first so that a partial download is never used
+        fd, tmpname = tempfile.mkstemp(dir=self.folder, prefix=".download-")
+        try:
+            with os.fdopen(fd, "wb") as f, urllib.request.urlopen(url, timeout=60) as r:
+                shutil.copyfileobj(r, f, 1024 * 1024)
+            os.chmod(tmpname, 0o644)
+            os.replace(tmpname, path)
+        except BaseException:
+            try:
+                os.remove(tmpname)
+            except OSError:
+                pass
+            raise
+
+    def ensure(self, version):
+        """
+        Path of the verified jar for version, downloaded from the repository if it is not already cached (or
+        fails its check). Raises OSError if it cannot be downloaded, or ValueError if the download does not match
+        the published checksum.
+        """
+        path = self.jar_path(version)
+        if self.verify(version):
+            return path
+        with urllib.request.urlopen(self.jar_url(version) + ".sha256", timeout=60) as r:
+            checksum = r.read().decode("utf-8", "replace").split()
+        if not checksum:
+            raise ValueError("empty checksum for {}".format(self.jar_url(version)))
+        self.fetch(self.jar_url(version), path)
+        if self.sha256(path) != checksum[0].lower():
+            os.remove(path)
+            raise ValueError("checksum mismatch for {}".format(self.jar_url(version)))
+        with open(path + ".sha256", "w") as f:
+            f.write(checksum[0].lower() + "\n")
+        return path
@@ -0,0 +1,63 @@
+import re
+import threading
+
+# Fields captured from the Detect output as it streams by
+detect_fields = {
+    'status': re.compile(r'Overall Status: (.*)'),
+    'bom': re.compile(r'Black Duck Project BOM: (.*)'),
+    'run_directory': re.compile(r'Run directory: (.*)'),
+}
+
+
+class DetectOutput(object):
+    """
+    Pump for the output of a Detect run: lines are read from the process stream in a background thread and
+    fanned out to the console, the log file and listeners, and the fields in detect_fields are captured as they
+    are seen, so the log never needs to be read back. Listeners are called with (field, value) when a field is
+    first captured and with (None, line) for every line.
+    """
+
+    def __init__(self, stream, log_file, echo=True):
+        self.stream = stream
+        self.log_file = log_file
+        self.echo = echo
+        self.fields = {}
+        self.listeners = []
+        self.thread = None
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def start(self):
+        self.thread = threading.Thread(target=self.pump, name="detect-output", daemon=True)
+        self.thread.start()
+
+    def pump(self):
+        for raw in iter(self.stream.readline, b''):
+            line = raw.decode('utf-8', 'replace')
+            self.log_file.write(line)
+            if self.echo:
+                print(line.rstrip())
+            self.parse(line.rstrip('\r\n'))
+        self.log_file.flush()
+
+    def parse(self, line):
+        for listener in self.listeners:
+            listener(None, line)
+        for field, pattern in detect_fields.items():
+            if field in self.fields:
+                continue
+            match = pattern.search(line)
+            if match:
+                self.fields[field] = match.group(1).strip()
+                for listener in self.listeners:
+                    listener(field, self.fields[field])
+
+    def wait(self):
+        # Wait for the stream to be closed - returns the captured fields
+        if self.thread is not None:
+            self.thread.join()
+        return self.fields
+
+    def get(self, field):
+        return self.fields.get(field)
@@ -0,0 +1,91 @@
+import json
+import re
+import time
+
+# Phases of a Detect run and the output lines which mark the start of each (matched case insensitively).
+# The run starts in 'Startup' and ends in 'Results' (the status block Detect prints before exiting).
+detect_phases = [
+    ('Startup', None),
+    ('Detectors', r'Detector Tool|Searching for detectors|Evaluating detectors|Extracting \d+ of \d+'),
+    ('Docker', r'Docker Tool|Docker Inspector'),
+    ('Binary scan', r'Binary Scan(?:ner)? Tool|Starting the binary scan'),
+    ('Signature scan', r'Signature Scan(?:ner)? Tool|Starting the (?:Black Duck )?Signature Scan'),
+    ('Impact analysis', r'Impact Analysis Tool'),
+    ('Upload', r'Upload(?:ing)? (?:of )?BDIO|BDIO (?:files? )?upload'),
+    ('BOM wait', r'Waiting for (?:the )?(?:Black Duck )?BOM|BOM to be updated'),
+    ('Reports', r'risk report|notices report|Checking (?:for )?polic(?:y|ies)|policy check'),
+    ('Results', r'Overall Status|=+ Detect Status|Detect Result'),
+]
+
+
+class DetectPhases(object):
+    """
+    Timing of the phases of a Detect run, as a listener for DetectOutput. The time of the first line matching
+    each phase pattern marks a boundary; a phase entered more than once (for example the detectors run again for
+    a second source path) accumulates the time of each visit.
+    """
+
+    def __init__(self):
+        self.patterns = [(name, re.compile(pattern, re.IGNORECASE)) for name, pattern in detect_phases if pattern]
+        self.start_time = time.time()
+        self.start = time.monotonic()
+        self.current = detect_phases[0][0]
+        self.current_start = self.start
+        # Phase name -> [first start (seconds from start of run), total seconds, visits], in the order entered
+        self.phases = {self.current: [0.0, 0.0, 1]}
+        self.end = None
+
+    def listener(self, field, line):
+        if field is not None or self.current == detect_phases[-1][0]:
+            return
+        for name, pattern in self.patterns:
+            if name != self.current and pattern.search(line):
+                self.enter(name)
+                break
+
+    def enter(self, name, now=None):
+        now = time.monotonic() if now is None else now
+        self.phases[self.current][1] += now - self.current_start
+        self.current = name
+        self.current_start = now
+        if name in self.phases:
+            self.phases[name][2] += 1
+        else:
+            self.phases[name] = [now - self.start, 0.0, 1]
+
+    def finish(self):
+        # Close the current phase when the Detect process has exited
+        if self.end is None:
+            self.end = time.monotonic()
+            self.phases[self.current][1] += self.end - self.current_start
+
+    def total(self):
+        return (self.end if self.end is not None else time.monotonic()) - self.start
+
+    @staticmethod
+    def duration(seconds):
+        seconds = int(round(seconds))
+        return "{}:{:02d}:{:02d}".format(seconds // 3600, seconds % 3600 // 60, seconds % 60)
+
+    def report(self):
+        total = self.total()
+        report = "\nDETECT RUN PHASES:\n{:<16} {:>10} {:>10} {:>8} {:>8}\n".format("Phase", "Started", "Duration",
+                                                                                 "% Run", "Visits")
+        for name, (started, seconds, visits) in self.phases.items():
+            report += "{:<16} {:>10} {:>10} {:>7.1f}% {:>8,d}\n".format(
+                name, self.duration(started), self.duration(seconds), 100 * seconds / total if total else 0.0,
+                visits)
+        report += "{:<16} {:>10} {:>10}\n".format("Total", "", self.duration(total))
+        return report
+
+    def to_dict(self):
+        return {
+            'started': time.strftime("%Y-%m-%dT%H:%M:%S%z", time.localtime(self.start_time)),
+            'total_seconds': round(self.total(), 3),
+            'phases': [{'phase': name, 'start_offset_seconds': round(started, 3), 'seconds': round(seconds, 3),
+                        'visits': visits} for name, (started, seconds, visits) in self.phases.items()],
+        }
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
@@ -0,0 +1,142 @@
+import heapq
+from array import array
+
+
+class FileTable(object):
+    """
+    Classified files of the scan held column-wise in arrays: an interned folder id, the file name (in a single
+    byte buffer), file type code, size, compressed size and flags. A row uses a few tens of bytes rather than a
+    path string per file type list, and path lists are queries over the columns. Counts and total sizes by file
+    type and archive flag are kept as running totals, so they do not scan the table.
+    Archive members are stored under their folder within the archive (for example 'x.zip##lib/').
+    """
+    ftypes = ['detect_wizard_src', 'bin', 'jar', 'arc', 'pkg', 'other', 'det']
+    in_archive_flag = 1
+    license_flag = 2
+    removed_flag = 4
+
+    def __init__(self):
+        # Folder prefixes (including the trailing separator) and their ids
+        self.folders = []
+        self.folder_ids = {}
+        self.folder = array('I')
+        self.names = bytearray()
+        self.name_end = array('Q')
+        self.ftype = array('B')
+        self.size = array('Q')
+        self.size_comp = array('Q')
+        self.flags = array('B')
+        # path -> row, only built when rows are removed
+        self.index = None
+        # (file type code, in archive) -> [number of rows, total size] of the rows not removed
+        self.totals = {}
+
+    def __len__(self):
+        return len(self.ftype)
+
+    def add(self, path, name, ftype, size, size_comp, in_archive, is_lic=False):
+        prefix = path[:len(path) - len(name)]
+        folder_id = self.folder_ids.get(prefix)
+        if folder_id is None:
+            folder_id = self.folder_ids[prefix] = len(self.folders)
+            self.folders.append(prefix)
+        self.folder.append(folder_id)
+        self.names += name.encode('utf-8', 'surrogateescape')
+        self.name_end.append(len(self.names))
+        self.ftype.append(self.ftypes.index(ftype))
+        self.size.append(size)
+        self.size_comp.append(size_comp)
+        self.flags.append((self.in_archive_flag if in_archive else 0) | (self.license_flag if is_lic else 0))
+        self.add_total(self.ftype[-1], bool(in_archive), 1, size)
+        if self.index is not None:
+            self.index[path] = len(self.ftype) - 1
+        return len(self.ftype) - 1
+
+    def add_total(self, code, in_archive, num, size):
+        total = self.totals.setdefault((code, in_archive), [0, 0])
+        total[0] += num
+        total[1] += size
+
+    def name(self, row):
+        start = self.name_end[row - 1] if row > 0 else 0
+        return self.names[start:self.name_end[row]].decode('utf-8', 'surrogateescape')
+
+    def path(self, row):
+        return self.folders[self.folder[row]] + self.name(row)
+
+    def remove(self, path):
+        # Mark the row of path removed - returns False if path is not in the table
+        if self.index is None:
+            self.index = {self.path(row): row for row in self.rows()}
+        row = self.index.pop(path, None)
+        if row is None:
+            return False
+        self.flags[row] |= self.removed_flag
+        self.add_total(self.ftype[row], bool(self.flags[row] & self.in_archive_flag), -1, -self.size[row])
+        return True
+
+    def rows(self, ftype=None, in_archive=None):
+        """
+        Rows (not removed) of file type ftype (any if None), within archives or not (either if None).
+        """
+        code = self.ftypes.index(ftype) if ftype is not None else None
+        # The removed flag is always tested - archive flag tested only if in_archive is set
+        mask = self.removed_flag | (self.in_archive_flag if in_archive is not None else 0)
+        want = self.in_archive_flag if in_archive else 0
+        ftypes = self.ftype
+        flags = self.flags
+        if code is None:
+            return (row for row in range(len(ftypes)) if flags[row] & mask == want)
+        return (row for row in range(len(ftypes)) if ftypes[row] == code and flags[row] & mask == want)
+
+    def paths(self, ftype=None, in_archive=None):
+        return (self.path(row) for row in self.rows(ftype, in_archive))
+
+    def outer_paths(self, ftype=None):
+        # Paths on disk of the files of ftype - the path of the outermost archive for files within archives
+        outer = set()
+        for row in self.rows(ftype):
+            if self.flags[row] & self.in_archive_flag:
+                outer.add(self.folders[self.folder[row]].split("##")[0])
+            else:
+                outer.add(self.path(row))
+        return outer
+
+    def matching_totals(self, ftype, in_archive):
+        code = self.ftypes.index(ftype) if ftype is not None else None
+        return (total for (tcode, tarc), total in self.totals.items()
+                if (code is None or tcode == code) and (in_archive is None or tarc == bool(in_archive)))
+
+    def count(self, ftype=None, in_archive=None):
+        return sum(total[0] for total in self.matching_totals(ftype, in_archive))
+
+    def total_size(self, ftype=None, in_archive=None):
+        return sum(total[1] for total in self.matching_totals(ftype, in_archive))
+
+    def largest(self, k, ftype=None, in_archive=None):
+        # The k largest files as (size, path), largest first
+        size = self.size
+        return [(size[row], self.path(row)) for row in heapq.nlargest(k, self.rows(ftype, in_archive),
+                                                                       key=size.__getitem__)]
+
+    def to_state(self):
+        return {'folders': self.folders, 'folder': self.folder.tolist(),
+                'names': self.names.decode('utf-8', 'surrogateescape'), 'name_end': self.name_end.tolist(),
+                'ftype': self.ftype.tolist(), 'size': self.size.tolist(), 'size_comp': self.size_comp.tolist(),
+                'flags': self.flags.tolist()}
+
+    def load_state(self, state):
+        self.folders = list(state['folders'])
+        self.folder_ids = {prefix: folder_id for folder_id, prefix in enumerate(self.folders)}
+        self.folder = array('I', state['folder'])
+        self.names = bytearray(state['names'].encode('utf-8', 'surrogateescape'))
+        self.name_end = array('Q', state['name_end'])
+        self.ftype = array('B', state['ftype'])
+        self.size = array('Q', state['size'])
+        self.size_comp = array('Q', state['size_comp'])
+        self.flags = array('B', state['flags'])
+        self.index = None
+        self.totals = {}
+        for code, size, flags in zip(self.ftype, self.size, self.flags):
+            if not flags & self.removed_flag:
+                self.add_total(code, bool(flags & self.in_archive_flag), 1, size)
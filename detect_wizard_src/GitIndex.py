@@ -0,0 +1,179 @@
+import hashlib
+import os
+import stat
+import struct
+
+
+def find_git_dir(path):
+    """
+    Return (work tree, git dir) for the repository containing path, or (None, None). Only the local
+    repository is read - a .git file (worktrees and submodules) is followed to the git dir it names.
+    """
+    path = os.path.abspath(path)
+    while True:
+        dotgit = os.path.join(path, ".git")
+        if os.path.isdir(dotgit):
+            return path, dotgit
+        if os.path.isfile(dotgit):
+            try:
+                with open(dotgit, "r") as g:
+                    line = g.readline().strip()
+                if line.startswith("gitdir:"):
+                    gitdir = line[len("gitdir:"):].strip()
+                    return path, os.path.normpath(os.path.join(path, gitdir))
+            except OSError:
+                pass
+            return None, None
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None, None
+        path = parent
+
+
+def git_blob_id(path):
+    # Blob id as computed by 'git hash-object'
+    sha1 = hashlib.sha1()
+    sha1.update("blob {}\0".format(os.path.getsize(path)).encode())
+    with open(path, 'rb') as afile:
+        buffr = afile.read(1024 * 1024)
+        while buffr:
+            sha1.update(buffr)
+            buffr = afile.read(1024 * 1024)
+    return sha1.hexdigest()
+
+
+class GitIndex(object):
+    """
+    Tracked files of a git work tree read from the index file (versions 2, 3 and 4), giving blob ids as
+    content identity for files which are unchanged since they were staged.
+    """
+
+    def __init__(self, work_tree, git_dir):
+        self.work_tree = work_tree
+        self.git_dir = git_dir
+        # path relative to the work tree ('/' separated) -> (mtime seconds, mtime nanoseconds, size, blob id)
+        self.entries = {}
+        self.index_mtime = 0
+        self.blob_cache = {}
+        self.num_reused = 0
+        self.num_hashed = 0
+
+    @classmethod
+    def open(cls, path):
+        """
+        Return the GitIndex for the repository containing path, or None if there is no readable index.
+        """
+        work_tree, git_dir = find_git_dir(path)
+        if work_tree is None:
+            return None
+        index = cls(work_tree, git_dir)
+        try:
+            index.load()
+        except (OSError, ValueError, struct.error):
+            return None
+        return index
+
+    def load(self):
+        index_file = os.path.join(self.git_dir, "index")
+        with open(index_file, 'rb') as i:
+            data = i.read()
+        self.index_mtime = os.stat(index_file).st_mtime
+        if data[:4] != b'DIRC':
+            raise ValueError("Not a git index file")
+        version, num_entries = struct.unpack_from('>II', data, 4)
+        if version not in [2, 3, 4]:
+            raise ValueError("Unsupported git index version {}".format(version))
+
+        pos = 12
+        prev_path = b''
+        for _ in range(num_entries):
+            start = pos
+            (ctime_s, ctime_ns, mtime_s, mtime_ns, dev, ino, mode, uid, gid, size) = struct.unpack_from('>10I', data, pos)
+            blob = data[pos + 40:pos + 60].hex()
+            flags = struct.unpack_from('>H', data, pos + 60)[0]
+            pos += 62
+            if version >= 3 and flags & 0x4000:
+                # Extended flags
+                pos += 2
+            if version == 4:
+                # Path is prefix compressed against the previous entry
+                strip, pos = self.read_offset(data, pos)
+                end = data.index(b'\0', pos)
+                path = prev_path[:len(prev_path) - strip] + data[pos:end]
+                pos = end + 1
+            else:
+                end = data.index(b'\0', pos)
+                path = data[pos:end]
+                # Entries are padded with 1-8 NULs to a multiple of 8 bytes
+                pos = start + ((end - start + 8) & ~7)
+            prev_path = path
+
+            stage = (flags >> 12) & 0x3
+            if stage != 0 or (mode >> 12) == 0b1110:
+                # Conflicted entries and submodules (gitlinks) have no usable blob
+                self.entries.pop(path.decode('utf-8', 'surrogateescape'), None)
+                continue
+            self.entries[path.decode('utf-8', 'surrogateescape')] = (mtime_s, mtime_ns, size, blob)
+
+    @staticmethod
+    def read_offset(data, pos):
+        c = data[pos]
+        pos += 1
+        val = c & 0x7f
+        while c & 0x80:
+            c = data[pos]
+            pos += 1
+            val = ((val + 1) << 7) | (c & 0x7f)
+        return val, pos
+
+    def relpath(self, path):
+        return os.path.relpath(os.path.abspath(path), self.work_tree).replace(os.sep, '/')
+
+    def is_tracked(self, path):
+        return self.relpath(path) in self.entries
+
+    def tracked_blob_id(self, path, st=None):
+        """
+        Blob id from the index if path is tracked and unchanged (same size and modification time, and not
+        modified in the same second the index was written - as git treats such entries as racy), else None.
+        """
+        entry = self.entries.get(self.relpath(path))
+        if entry is None:
+            return None
+        if st is None:
+            st = os.stat(path)
+        mtime_s, mtime_ns, size, blob = entry
+        if size != (st.st_size & 0xffffffff) or mtime_s != st.st_mtime_ns // 1000000000 or \
+                mtime_ns != st.st_mtime_ns % 1000000000 or st.st_mtime >= self.index_mtime:
+            return None
+        return blob
+
+    def content_id(self, path):
+        """
+        Content identity of a file on disk - the blob id from the index for unchanged tracked files, otherwise
+        the blob id is computed from the file content (once per file).
+        """
+        if path not in self.blob_cache:
+            blob = self.tracked_blob_id(path)
+            if blob is None:
+                blob = git_blob_id(path)
+                self.num_hashed += 1
+            else:
+                self.num_reused += 1
+            self.blob_cache[path] = blob
+        return self.blob_cache[path]
+
+    def same_content(self, apath, bpath):
+        """
+        Whether two files on disk have the same content. Files of different sizes differ and files with the same
+        type, size and modification time are taken as equal (as filecmp's shallow comparison) without reading
+        them; otherwise the blob ids are compared, computed from the content only for files which are not
+        unchanged tracked files.
+        """
+        ast = os.stat(apath)
+        bst = os.stat(bpath)
+        if ast.st_size != bst.st_size:
+            return False
+        if (stat.S_IFMT(ast.st_mode), ast.st_mtime) == (stat.S_IFMT(bst.st_mode), bst.st_mtime):
+            return True
+        return self.content_id(apath) == self.content_id(bpath)
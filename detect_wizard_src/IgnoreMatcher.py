@@ -0,0 +1,148 @@
+import fnmatch
+import os
+import re
+
+
+class IgnoreMatcher(object):
+    """
+    Ignore rules compiled into a single matcher which is evaluated for each entry as a folder is read.
+
+    Rules are either unanchored (exact names or glob patterns matched against the entry name at any depth,
+    e.g. ignored_files_and_directories or '--ignore *.log') or anchored to a folder (.bdignore entries such
+    as /folder/ or /folder/sub/, or '--ignore' patterns containing a '/' which are anchored to the scan
+    folder). Anchored rules are held as the path segments remaining below the current folder and are
+    advanced one segment per level by for_folder(), so the rules are inherited down the tree and each
+    entry is only compared against the rules which can still apply to it.
+    A trailing '/' on a rule restricts it to folders.
+    """
+
+    def __init__(self, names=(), patterns=(), anchored=()):
+        self.names = frozenset(names)
+        self.patterns = tuple(patterns)
+        self.anchored = tuple(anchored)
+
+        self.pattern_re = None
+        if self.patterns:
+            self.pattern_re = re.compile('|'.join(fnmatch.translate(p) for p in self.patterns))
+
+        # First segment of the anchored rules - exact names are looked up directly, globs are compiled
+        self.exact = {}
+        self.wild = []
+        for segs, dir_only in self.anchored:
+            if IgnoreMatcher.is_glob(segs[0]):
+                self.wild.append((re.compile(fnmatch.translate(segs[0])), segs, dir_only))
+            else:
+                self.exact.setdefault(segs[0], []).append((segs, dir_only))
+
+    @staticmethod
+    def is_glob(pattern):
+        return any(ch in pattern for ch in '*?[')
+
+    @staticmethod
+    def parse_rule(rule):
+        # Returns (segments, dir_only, anchored) or None for an empty or comment line
+        rule = rule.strip()
+        if not rule or rule.startswith('#'):
+            return None
+        dir_only = rule.endswith('/')
+        anywhere = rule.startswith('**/')
+        segs = tuple(s for s in rule.split('/') if s)
+        if anywhere:
+            segs = segs[1:]
+        if not segs:
+            return None
+        # As for .gitignore, a rule containing a '/' (other than a trailing one) is anchored
+        return segs, dir_only, not anywhere and (rule.startswith('/') or len(segs) > 1)
+
+    @classmethod
+    def compile(cls, path, names=(), patterns=()):
+        """
+        Create the matcher for the scan folder path from the names ignored everywhere, the --ignore patterns
+        and the .bdignore file in the scan folder.
+        """
+        names = set(names)
+        globs = []
+        anchored = []
+        for pattern in patterns or ():
+            rule = cls.parse_rule(pattern)
+            if rule is None:
+                continue
+            segs, dir_only, is_anchored = rule
+            if is_anchored:
+                anchored.append((segs, dir_only))
+            elif dir_only or len(segs) > 1:
+                # Kept as a '**' rule which is carried to, and can match at, every level
+                anchored.append((('**',) + segs, dir_only))
+            elif cls.is_glob(segs[0]):
+                globs.append(segs[0])
+            else:
+                names.add(segs[0])
+        return cls(names, globs, anchored + cls.read_bdignore(path))
+
+    @staticmethod
+    def read_bdignore(path):
+        # .bdignore entries are folder patterns anchored to the folder containing the .bdignore file
+        rules = []
+        try:
+            with open(os.path.join(path, ".bdignore"), "r") as b:
+                for bline in b:
+                    rule = IgnoreMatcher.parse_rule(bline)
+                    if rule is not None:
+                        rules.append((rule[0], rule[1]))
+        except OSError:
+            pass
+        return rules
+
+    def matches(self, name, is_dir):
+        if name in self.names:
+            return True
+        if self.pattern_re is not None and self.pattern_re.match(name):
+            return True
+        for segs, dir_only in self.exact.get(name, ()):
+            if len(segs) == 1 and (is_dir or not dir_only):
+                return True
+        for seg_re, segs, dir_only in self.wild:
+            if segs[0] == '**':
+                if len(segs) == 2 and (is_dir or not dir_only) and fnmatch.fnmatchcase(name, segs[1]):
+                    return True
+            elif len(segs) == 1 and (is_dir or not dir_only) and seg_re.match(name):
+                return True
+        return False
+
+    def for_folder(self, name, path):
+        """
+        Return the matcher for the entries of sub-folder name (at path): anchored rules are advanced
+        past name and rules from the folder's .bdignore file are added.
+        """
+        anchored = []
+        for segs, dir_only in self.exact.get(name, ()):
+            if len(segs) > 1:
+                anchored.append((segs[1:], dir_only))
+        for seg_re, segs, dir_only in self.wild:
+            if segs[0] == '**':
+                anchored.append((segs, dir_only))
+                if len(segs) > 2 and fnmatch.fnmatchcase(name, segs[1]):
+                    anchored.append((segs[2:], dir_only))
+            elif len(segs) > 1 and seg_re.match(name):
+                anchored.append((segs[1:], dir_only))
+        anchored += self.read_bdignore(path)
+        if not anchored and not self.anchored:
+            return self
+        return IgnoreMatcher(self.names, self.patterns, anchored)
+
+
+def tree_size(path):
+    """
+    Total size of the files beneath path, without classifying them (used for ignored folders).
+    """
+    size = 0
+    try:
+        with os.scandir(path) as scandir_it:
+            for entry in scandir_it:
+                if entry.is_dir(follow_symlinks=False):
+                    size += tree_size(entry.path)
+                else:
+                    size += entry.stat(follow_symlinks=False).st_size
+    except OSError:
+        pass
+    return size
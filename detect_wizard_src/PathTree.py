@@ -1,65 +1,138 @@
+import heapq
+import os
+import queue
+import threading
 from pathlib import Path
 
+from detect_wizard_src.file_size_util import b_to_gb
+
 
 class PathTree(object):
-    # Set up spacer character defs
+    """
+    Layout of the file tree section of the input log - folders are listed with their entries in name order (at
+    most max_children of them) below, drawn with these spacer characters.
+    """
     display_filename_prefix_middle = '├──'
     display_filename_prefix_last = '└──'
     display_parent_prefix_middle = '│   '
     display_parent_prefix_last = '    '
     max_children = 1000
 
-    def __init__(self, path, parent_path, is_last, max_depth):
-        self.path = Path(str(path))
-        self.parent = parent_path
-        self.is_last = is_last
+
+class _TreeOrder(object):
+    # Heap item ordered in reverse so that heapq keeps the largest of the entries selected so far on top
+    __slots__ = ('key', 'entry')
+
+    def __init__(self, key, entry):
+        self.key = key
+        self.entry = entry
+
+    def __lt__(self, other):
+        return self.key > other.key
+
+
+class TreeLogWriter(threading.Thread):
+    """
+    Writes the file tree section of the input log from the directory entries reported by the folder walk
+    (process_dir), using the same layout as PathTree. Lines are written by a background thread so that
+    logging never holds up the walk.
+    """
+    batch_size = 512
+
+    def __init__(self, log_file, max_depth=6):
+        super().__init__(daemon=True)
+        self.log_file = log_file
         self.max_depth = max_depth
-        if self.parent:
-            self.depth = self.parent.depth + 1
-        else:
-            self.depth = 0
-
-    @property
-    def display_name(self):
-        out_str = self.path.name
-        if self.path.is_dir():
-            out_str += '/'  # add directory /
-        return out_str + ("   -- Max depth ({}) for scan-input logfile reached. ".format(self.max_depth) if self.depth == self.max_depth else "")
-
-    @classmethod
-    def make_tree(cls, root, max_depth=6, parent=None, is_last=False):
-        root = Path(str(root))
-        displayable_root = cls(root, parent, is_last, max_depth)
-        yield displayable_root
-        if displayable_root.depth < max_depth:
-            children = sorted(list(path for path in root.iterdir()), key=lambda s: str(s).lower())
-            count = 1
-
-            for path in children[0:min(PathTree.max_children, len(children))]:
-                is_last = count == len(children) or displayable_root.depth+1 == max_depth
-                if path.is_dir():
-                    yield from cls.make_tree(path,
-                                             parent=displayable_root,
-                                             is_last=is_last,
-                                             max_depth=max_depth)
+        self.truncated = False
+        self.pending = []
+        self.lines = queue.Queue()
+        # Size is tracked by counting the bytes written instead of a stat per line
+        self.log_file.flush()
+        self.written = os.fstat(self.log_file.fileno()).st_size
+        self.start()
+
+    def expands(self, depth):
+        # Whether the children of a folder at this tree depth are logged
+        return depth < self.max_depth
+
+    def root(self, path):
+        self._put(Path(str(path)).name + '/')
+
+    def entry(self, prefix, name, is_dir, is_last, depth, ignored=False):
+        """
+        Log one entry at the given tree depth below a folder whose children are indented by prefix.
+        Returns the prefix used to indent the entry's own children.
+        """
+        line = prefix + (PathTree.display_filename_prefix_last if is_last
+                         else PathTree.display_filename_prefix_middle) + ' ' + name
+        if is_dir:
+            line += '/'
+        if ignored:
+            line += "   -- Ignored"
+        elif depth == self.max_depth:
+            line += "   -- Max depth ({}) for scan-input logfile reached. ".format(self.max_depth)
+        self._put(line)
+        return prefix + (PathTree.display_parent_prefix_last if is_last else PathTree.display_parent_prefix_middle)
+
+    def entries(self, scandir_it, prefix, depth, ignored=None):
+        """
+        Yield (entry, child_prefix) for the entries of a folder whose children are at the given tree depth.
+        The first max_children entries (in tree order) are logged as they are yielded, at the end. Entries
+        which will not be logged are yielded (with child_prefix None) as soon as that is known, so no more
+        than max_children entries are held for any folder. Logged entries for which ignored(entry) is true
+        are marked as ignored.
+        """
+        if not self.expands(depth - 1):
+            for entry in scandir_it:
+                yield entry, None
+            return
+
+        heap = []
+        num_entries = 0
+        for entry in scandir_it:
+            item = _TreeOrder((entry.name.lower(), num_entries), entry)
+            num_entries += 1
+            if len(heap) < PathTree.max_children:
+                heapq.heappush(heap, item)
+            elif item.key < heap[0].key:
+                yield heapq.heapreplace(heap, item).entry, None
+            else:
+                yield entry, None
+
+        heap.sort(key=lambda i: i.key)
+        for idx, item in enumerate(heap):
+            is_last = idx + 1 == num_entries or depth == self.max_depth
+            yield item.entry, self.entry(prefix, item.entry.name, item.entry.is_dir(), is_last, depth,
+                                         ignored is not None and ignored(item.entry))
+
+    def _put(self, line):
+        self.pending.append(line)
+        if len(self.pending) >= self.batch_size:
+            self.lines.put(self.pending)
+            self.pending = []
+
+    def run(self):
+        while True:
+            batch = self.lines.get()
+            if batch is None:
+                break
+            if self.truncated:
+                continue
+            out = []
+            for line in batch:
+                if b_to_gb(self.written) <= 1:
+                    out.append(line)
+                    self.written += len(line.encode('utf-8')) + 1
                 else:
-                    yield cls(path, displayable_root, is_last, max_depth)
-                count += 1
-
-    def displayable(self):
-        if self.parent is None:
-            return self.display_name
-
-        _filename_prefix = (self.display_filename_prefix_last
-                            if self.is_last
-                            else self.display_filename_prefix_middle)
-
-        parts = ['{!s} {!s}'.format(_filename_prefix, self.display_name)]
-
-        parent = self.parent
-        while parent and parent.parent is not None:
-            parts.append(self.display_parent_prefix_middle
-                         if not parent.is_last
-                         else self.display_parent_prefix_last)
-            parent = parent.parent
-        return ''.join(reversed(parts))
+                    out.append("----> INPUT LOG FILE TRUNCATED FOR REACHING 1 GB. <----")
+                    self.truncated = True
+                    break
+            self.log_file.write("\n".join(out) + "\n")
+        self.log_file.flush()
+
+    def close(self):
+        if self.pending:
+            self.lines.put(self.pending)
+            self.pending = []
+        self.lines.put(None)
+        self.join()
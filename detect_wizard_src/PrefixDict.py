@@ -0,0 +1,54 @@
+import bisect
+
+
+class PrefixDict(dict):
+    """
+    Dict with str keys which can list the keys starting with a prefix (for example the records below a folder)
+    without scanning every key. The sorted key list is only built by the first prefix query, so filling the
+    dict costs nothing extra, and is kept up to date after that.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.sorted_keys = None
+
+    def __setitem__(self, key, value):
+        if self.sorted_keys is not None and key not in self:
+            bisect.insort(self.sorted_keys, key)
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        if self.sorted_keys is not None:
+            del self.sorted_keys[bisect.bisect_left(self.sorted_keys, key)]
+
+    def pop(self, key, *default):
+        if key not in self:
+            return super().pop(key, *default)
+        value = self[key]
+        del self[key]
+        return value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self.sorted_keys = None
+
+    def clear(self):
+        super().clear()
+        self.sorted_keys = None
+
+    def keys_with_prefix(self, prefix):
+        # Keys starting with prefix, in sorted order (a list, so the dict can be changed while it is used)
+        if self.sorted_keys is None:
+            self.sorted_keys = sorted(self)
+        keys = self.sorted_keys
+        start = bisect.bisect_left(keys, prefix)
+        end = start
+        while end < len(keys) and keys[end].startswith(prefix):
+            end += 1
+        return keys[start:end]
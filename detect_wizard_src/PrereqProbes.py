@@ -0,0 +1,195 @@
+import atexit
+import hashlib
+import json
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+# Arguments to print the version of tools which do not accept --version
+version_args = {'go': ['version']}
+
+# Number of probes run at the same time
+max_workers = 8
+# Seconds the interpreter waits at exit for probes still running, so that their results can be cached
+exit_wait = 2
+
+
+def java_version_output():
+    # Output of 'java -version', or None if java cannot be run
+    try:
+        return subprocess.check_output(['java', '-version'], stderr=subprocess.STDOUT).decode("utf-8", "replace")
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def curl_connects(url):
+    try:
+        subprocess.check_output(['curl', '-s', '-m', '5', url], stderr=subprocess.STDOUT)
+        return True
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+def tool_version(path):
+    # First line of the version output of the package manager tool at path
+    exe = os.path.splitext(os.path.basename(path))[0]
+    try:
+        output = subprocess.run([path] + version_args.get(exe, ['--version']), stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL, timeout=30).stdout
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+    for line in output.decode("utf-8", "replace").splitlines():
+        if line.strip():
+            return line.strip()
+    return "unknown"
+
+
+def docker_runs():
+    try:
+        subprocess.check_output(['docker', 'run', 'hello-world'], stderr=subprocess.STDOUT)
+        return True
+    except (OSError, subprocess.SubprocessError):
+        return False
+
+
+class PrereqProbes(object):
+    """
+    Prerequisite checks (java version, network connections, docker, package manager tool versions) run in
+    background threads so that they overlap with each other and with the scan. Results are cached in a JSON file for ttl seconds, keyed by PATH
+    and the java executable found on it, so that repeated runs on the same host do not wait for them.
+    The threads are daemon threads, so a probe which is still running does not delay the exit of the wizard.
+    """
+
+    def __init__(self, cache_file=None, ttl=0):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.java = shutil.which("java")
+        self.key = hashlib.sha1("{}\0{}".format(os.environ.get("PATH", ""),
+                                                os.path.realpath(self.java) if self.java else "").encode(
+            "utf-8", "surrogateescape")).hexdigest()
+        self.cached = self.read_cache()
+        # name -> Event set when the probe has completed, and name -> (result, exception) of completed probes
+        self.events = {}
+        self.results = {}
+        self.pending = queue.Queue()
+        self.workers = []
+        self.closed = False
+
+    def read_cache(self):
+        if not self.cache_file or self.ttl <= 0:
+            return {}
+        try:
+            with open(self.cache_file, "r") as f:
+                entries = json.load(f).get(self.key, {})
+        except (OSError, ValueError, AttributeError):
+            return {}
+        now = time.time()
+        return {name: entry[1] for name, entry in entries.items() if now - entry[0] < self.ttl}
+
+    def write_cache(self, results):
+        if not self.cache_file or self.ttl <= 0 or not results:
+            return
+        try:
+            with open(self.cache_file, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        now = time.time()
+        entries = data.setdefault(self.key, {})
+        for name, value in results.items():
+            entries[name] = [now, value]
+        # Drop entries for other PATHs which have expired
+        for key in list(data):
+            data[key] = {name: entry for name, entry in data[key].items() if now - entry[0] < self.ttl}
+            if not data[key]:
+                del data[key]
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+            fd, tmpname = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.cache_file)), prefix=".prereqs-")
+            with os.fdopen(fd, "w") as f:
+                json.dump(data, f)
+            os.replace(tmpname, self.cache_file)
+        except OSError:
+            pass
+
+    def probe(self, name):
+        if name == 'java':
+            return java_version_output() if self.java else None
+        if name == 'docker':
+            return docker_runs()
+        if name.startswith('connection:'):
+            return curl_connects(name[len('connection:'):])
+        if name.startswith('version:'):
+            return tool_version(name[len('version:'):])
+        raise ValueError("Unknown prerequisite probe {}".format(name))
+
+    def start(self, names):
+        for name in names:
+            if name not in self.cached and name not in self.events:
+                self.events[name] = threading.Event()
+                self.pending.put(name)
+                if len(self.workers) < max_workers:
+                    worker = threading.Thread(target=self.run_probes, daemon=True)
+                    worker.start()
+                    self.workers.append(worker)
+
+    def run_probes(self):
+        while not self.closed:
+            try:
+                name = self.pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self.results[name] = (self.probe(name), None)
+            except Exception as e:
+                self.results[name] = (None, e)
+            self.events[name].set()
+
+    def result(self, name):
+        """
+        Result of probe name, waiting for it if it is still running (it is started if it was not).
+        """
+        if name in self.cached:
+            return self.cached[name]
+        self.start([name])
+        self.events[name].wait()
+        value, error = self.results[name]
+        if error is not None:
+            raise error
+        return value
+
+    def completed(self, names, timeout):
+        """
+        Results of the probes in names which complete within timeout seconds (in total) - the others are left
+        running.
+        """
+        self.start(names)
+        deadline = time.monotonic() + timeout
+        for name in names:
+            if name in self.events:
+                self.events[name].wait(max(0, deadline - time.monotonic()))
+        return {name: self.result(name) for name in names if name in self.cached or self.events[name].is_set()}
+
+    def close(self):
+        # Save the results of completed probes - probes not yet started are dropped, and probes still running
+        # are given up to exit_wait seconds at exit to complete and be saved
+        self.closed = True
+        while True:
+            try:
+                del self.events[self.pending.get_nowait()]
+            except queue.Empty:
+                break
+        self.save()
+        if not all(event.is_set() for event in self.events.values()):
+            atexit.register(self.save, exit_wait)
+
+    def save(self, timeout=0):
+        if timeout:
+            deadline = time.monotonic() + timeout
+            for event in self.events.values():
+                event.wait(max(0, deadline - time.monotonic()))
+        self.write_cache({name: value for name, (value, error) in list(self.results.items()) if error is None})
@@ -0,0 +1,173 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+from collections import OrderedDict
+from collections.abc import MutableMapping
+
+
+class ScanStore(object):
+    """
+    SQLite database in a temporary folder holding the scan model when it is too large to keep in memory.
+    """
+
+    def __init__(self, folder=None):
+        self.folder = tempfile.mkdtemp(prefix="detect_wizard_", dir=folder)
+        self.conn = sqlite3.connect(os.path.join(self.folder, "scan.db"))
+        # The database is discarded at exit, so it does not need to survive a crash
+        self.conn.execute("PRAGMA journal_mode=OFF")
+        self.conn.execute("PRAGMA synchronous=OFF")
+        self.conn.execute("PRAGMA cache_size=-65536")
+        self.tables = []
+
+    def dict(self, name, items=None, decode=None, key_codec=None):
+        table = DiskDict(self.conn, name, decode, key_codec)
+        self.tables.append(table)
+        if items:
+            table.update(items)
+        return table
+
+    def close(self):
+        self.tables = []
+        try:
+            self.conn.close()
+        except sqlite3.Error:
+            pass
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+
+class DiskDict(MutableMapping):
+    """
+    Dict with str keys (or keys converted to and from str by key_codec, a pair of functions) and JSON
+    serialisable values stored in a ScanStore table. Recently used values are held
+    in a bounded cache; values read from the dict can be changed in place while they are in the cache (values
+    are written back when they leave the cache). Values yielded when iterating are not written back unless
+    they are in the cache. Iteration is in the order the keys were first written to the table.
+    """
+
+    def __init__(self, conn, name, decode=None, key_codec=None, cache_size=100000, batch_size=10000):
+        self.conn = conn
+        self.name = name
+        self.decode = decode
+        self.encode_key, self.decode_key = key_codec or (str, str)
+        self.cache_size = cache_size
+        self.batch_size = batch_size
+        self.cache = OrderedDict()
+        # Keys of cached values which may have changed since they were written
+        self.dirty = set()
+        # Keys set which may not be in the table yet, in the order they were set - written first so that the
+        # table (and iteration) keeps that order
+        self.unwritten = {}
+        self.conn.execute('CREATE TABLE "{}" (key TEXT PRIMARY KEY, value TEXT)'.format(name))
+
+    def load(self, value):
+        value = json.loads(value)
+        return self.decode(value) if self.decode is not None else value
+
+    def write(self, keys):
+        self.conn.executemany(
+            'INSERT INTO "{}" (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value=excluded.value'.format(
+                self.name), ((self.encode_key(key), json.dumps(self.cache[key])) for key in keys))
+
+    def write_unwritten(self):
+        if self.unwritten:
+            self.write(self.unwritten)
+            self.dirty.difference_update(self.unwritten)
+            self.unwritten = {}
+
+    def sync(self):
+        # Write changed cached values so the table is complete
+        self.write_unwritten()
+        if self.dirty:
+            self.write(self.dirty)
+            self.dirty = set()
+
+    def cache_value(self, key, value):
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        self.dirty.add(key)
+        if len(self.cache) > self.cache_size:
+            # Values leave the cache in batches
+            self.write_unwritten()
+            evict = []
+            for key in self.cache:
+                if len(evict) >= self.batch_size:
+                    break
+                evict.append(key)
+            self.write([key for key in evict if key in self.dirty])
+            for key in evict:
+                del self.cache[key]
+                self.dirty.discard(key)
+
+    def __getitem__(self, key):
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            # The caller may change the value in place
+            self.dirty.add(key)
+            return self.cache[key]
+        row = self.conn.execute('SELECT value FROM "{}" WHERE key = ?'.format(self.name),
+                                (self.encode_key(key),)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        value = self.load(row[0])
+        self.cache_value(key, value)
+        return value
+
+    def __setitem__(self, key, value):
+        if key not in self.cache:
+            self.unwritten[key] = None
+        self.cache_value(key, value)
+
+    def __delitem__(self, key):
+        in_cache = self.cache.pop(key, None) is not None
+        self.dirty.discard(key)
+        self.unwritten.pop(key, None)
+        cur = self.conn.execute('DELETE FROM "{}" WHERE key = ?'.format(self.name), (self.encode_key(key),))
+        if not in_cache and cur.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        if key in self.cache:
+            return True
+        return self.conn.execute('SELECT 1 FROM "{}" WHERE key = ?'.format(self.name),
+                                 (self.encode_key(key),)).fetchone() is not None
+
+    def __len__(self):
+        self.sync()
+        return self.conn.execute('SELECT COUNT(*) FROM "{}"'.format(self.name)).fetchone()[0]
+
+    def rows(self, columns):
+        self.sync()
+        cur = self.conn.execute('SELECT {} FROM "{}" ORDER BY rowid'.format(columns, self.name))
+        while True:
+            rows = cur.fetchmany(self.batch_size)
+            if not rows:
+                break
+            yield from rows
+
+    def keys_with_prefix(self, prefix):
+        # Keys starting with prefix (a non-empty str), in sorted order - a range of the primary key index
+        self.sync()
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return [self.decode_key(row[0]) for row in self.conn.execute(
+            'SELECT key FROM "{}" WHERE key >= ? AND key < ? ORDER BY key'.format(self.name), (prefix, upper))]
+
+    def __iter__(self):
+        for row in self.rows("key"):
+            yield self.decode_key(row[0])
+
+    def items(self):
+        for key, value in self.rows("key, value"):
+            key = self.decode_key(key)
+            yield key, self.cache[key] if key in self.cache else self.load(value)
+
+    def values(self):
+        for key, value in self.items():
+            yield value
+
+    def clear(self):
+        self.cache.clear()
+        self.dirty = set()
+        self.unwritten = {}
+        self.conn.execute('DELETE FROM "{}"'.format(self.name))
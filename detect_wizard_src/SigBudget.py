@@ -0,0 +1,111 @@
+import os
+
+# Exclusion candidate categories in order of preference, with the share of the scan value of a folder of the
+# category counted as lost when it is excluded (binary-only folders have no scan value, and duplicate folders are
+# still scanned in their other location)
+category_weights = {'binary': 0.0, 'duplicate': 0.0, 'generated': 0.25, 'test/sample': 0.5, 'other': 1.0}
+
+generated_names = {'build', 'builds', 'target', 'dist', 'out', 'obj', 'bin', 'Debug', 'Release', 'x64', 'x86',
+                   '.gradle', '.mvn', '__pycache__', '.tox', '.nox', '.eggs', '.pytest_cache', '.cache', '.next',
+                   '.nuxt', 'bower_components', 'generated', 'generated-sources', 'gen', 'coverage', 'htmlcov',
+                   'site-packages', '.terraform', 'DerivedData'}
+test_names = {'test', 'tests', 'testing', 'testdata', 'test-data', 'test_data', '__tests__', 'spec', 'specs',
+              'e2e', 'it', 'fixtures', 'sample', 'samples', 'example', 'examples', 'demo', 'demos', 'benchmark',
+              'benchmarks', 'doc', 'docs'}
+
+
+def name_category(name):
+    # Category of a folder from its name alone (None if the name does not suggest one)
+    if name in generated_names or name.lower() in generated_names or name.endswith('.egg-info'):
+        return 'generated'
+    if name.lower() in test_names:
+        return 'test/sample'
+    return None
+
+
+class SigBudget(object):
+    """
+    Choose folders to exclude from the signature scan so that the projected scan size is within a byte budget,
+    losing as little coverage as possible. Candidates are (path, category, size, value) for folders on disk,
+    where value is the bytes of the folder which are useful to the signature scan (source and jar files, with
+    other files counted in part); they are taken in order of lost value per byte saved (weighted by category, so
+    binary-only and duplicate folders are taken first), largest first within a category, until the budget is
+    met. A folder replaces any chosen folders beneath it, a duplicate folder is not taken if the folder it
+    duplicates is excluded (and vice versa), and chosen folders no longer needed to meet the budget are then
+    dropped, most costly first. If the budget cannot be met, only the exclusions which lose no coverage are kept.
+    """
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.chosen = []
+        self.projected = 0
+        self.remaining = 0
+
+    @staticmethod
+    def cost(candidate):
+        path, category, size, value = candidate
+        return category_weights[category] * value
+
+    @staticmethod
+    def overlaps(apath, bpath):
+        # True if one of the folders is the other or is beneath it
+        return apath == bpath or apath.startswith(bpath.rstrip(os.sep) + os.sep) or \
+            bpath.startswith(apath.rstrip(os.sep) + os.sep)
+
+    def is_within_chosen(self, path, chosen_paths):
+        parent = os.path.dirname(path)
+        while parent and parent != path:
+            if parent in chosen_paths:
+                return True
+            path, parent = parent, os.path.dirname(parent)
+        return False
+
+    def plan(self, candidates, projected, originals=None):
+        """
+        Returns the chosen candidates in order of selection. originals maps each duplicate folder to the folder
+        it duplicates. self.remaining is the projected size after the exclusions (more than the budget if the
+        candidates cannot meet it).
+        """
+        originals = originals or {}
+        order = list(category_weights)
+        candidates = sorted((cand for cand in candidates if cand[2] > 0),
+                            key=lambda cand: (self.cost(cand) / cand[2], order.index(cand[1]), -cand[2], cand[0]))
+        self.projected = projected
+        chosen = {}
+        saved = 0
+        for cand in candidates:
+            if projected - saved <= self.budget:
+                break
+            path = cand[0]
+            if path in chosen or self.is_within_chosen(path, chosen):
+                continue
+            prefix = path.rstrip(os.sep) + os.sep
+            if cand[1] == 'duplicate' and any(self.overlaps(originals[path], sub) for sub in chosen):
+                # Part of the folder this duplicates is already excluded
+                continue
+            if any(self.overlaps(originals[dup], path)
+                   for dup in chosen if chosen[dup][1] == 'duplicate' and not dup.startswith(prefix)):
+                # Part of the only scanned copy of a chosen duplicate is within this folder
+                continue
+            for sub in [sub for sub in chosen if sub.startswith(prefix)]:
+                saved -= chosen.pop(sub)[2]
+            chosen[path] = cand
+            saved += cand[2]
+
+        if projected - saved > self.budget:
+            # The budget cannot be met - only exclusions which lose no coverage are kept
+            for path in [path for path in chosen if self.cost(chosen[path]) > 0]:
+                saved -= chosen.pop(path)[2]
+
+        # Drop exclusions which are not needed to meet the budget (in the reverse of the selection order)
+        for path in reversed(list(chosen)):
+            if projected - saved + chosen[path][2] <= self.budget:
+                saved -= chosen.pop(path)[2]
+
+        self.chosen = list(chosen.values())
+        self.remaining = projected - saved
+        return self.chosen
+
+    def patterns(self, root):
+        # Chosen folders as paths relative to the project folder (with / separators)
+        return [os.path.relpath(cand[0], root).replace(os.sep, '/') for cand in self.chosen]
@@ -0,0 +1,79 @@
+import heapq
+import os
+
+
+class SizeIndex(object):
+    """
+    Size and file count totals by category for every folder of the scan, rolled up so that each folder
+    holds the totals of its whole sub-tree, with top-K queries for the heaviest folders and largest files.
+    Only files on disk are indexed (files within archives are counted in the size of the archive).
+    """
+    categories = ['source', 'binary', 'archive', 'jar', 'other']
+    ftype_category = {'detect_wizard_src': 0, 'bin': 1, 'arc': 2, 'jar': 3}
+
+    def __init__(self, max_files=10):
+        # path -> [depth, sizes by category, counts by category]
+        self.folders = {}
+        self.max_files = max_files
+        # Min-heap of the largest files seen, bounded to max_files entries
+        self.largest_files = []
+        self.rolled_up = False
+
+    def add_folder(self, path, depth):
+        self.folders[path] = [depth, [0] * len(self.categories), [0] * len(self.categories)]
+
+    def add_file(self, folder, ftype, size, path):
+        cat = self.ftype_category.get(ftype, 4)
+        record = self.folders[folder]
+        record[1][cat] += size
+        record[2][cat] += 1
+        if len(self.largest_files) < self.max_files:
+            heapq.heappush(self.largest_files, (size, path))
+        elif size > self.largest_files[0][0]:
+            heapq.heapreplace(self.largest_files, (size, path))
+
+    def remove_file(self, folder, ftype, size):
+        cat = self.ftype_category.get(ftype, 4)
+        record = self.folders[folder]
+        record[1][cat] -= size
+        record[2][cat] -= 1
+
+    def set_largest_files(self, files):
+        # Rebuild the largest files from (size, path) items - used when files have been removed
+        self.largest_files = heapq.nlargest(self.max_files, files)
+        heapq.heapify(self.largest_files)
+
+    def rollup(self):
+        # Add each folder's totals to its parent, deepest folders first (bucketed by depth - linear in folders)
+        if self.rolled_up:
+            return
+        by_depth = {}
+        for path, record in self.folders.items():
+            by_depth.setdefault(record[0], []).append(path)
+        for depth in sorted(by_depth, reverse=True):
+            for path in by_depth[depth]:
+                parent = self.folders.get(os.path.dirname(path))
+                if parent is None or parent is self.folders[path]:
+                    continue
+                sizes, counts = self.folders[path][1], self.folders[path][2]
+                for cat in range(len(self.categories)):
+                    parent[1][cat] += sizes[cat]
+                    parent[2][cat] += counts[cat]
+        self.rolled_up = True
+
+    def sizes(self, path):
+        # Rolled-up sizes of the sub-tree by category name
+        return dict(zip(self.categories, self.folders[path][1]))
+
+    def total(self, path):
+        return sum(self.folders[path][1])
+
+    def num_files(self, path):
+        return sum(self.folders[path][2])
+
+    def top_folders(self, k, exclude=()):
+        self.rollup()
+        return heapq.nlargest(k, (path for path in self.folders if path not in exclude), key=self.total)
+
+    def top_files(self, k):
+        return sorted(self.largest_files, reverse=True)[:k]
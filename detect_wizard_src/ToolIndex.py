@@ -0,0 +1,51 @@
+import os
+import platform
+
+
+class ToolIndex(object):
+    """
+    Locations of a set of executables on the PATH, found by listing each PATH folder once (rather than a
+    shutil.which() call per lookup).
+    """
+
+    def __init__(self, exes, path=None):
+        self.locations = {}
+        self.index(set(exes), os.environ.get("PATH", os.defpath) if path is None else path)
+
+    def index(self, exes, path):
+        # Candidate file names for each exe - PATHEXT extensions are added on Windows as shutil.which() does
+        candidates = {}
+        dirs = path.split(os.pathsep)
+        if platform.system() == "Windows":
+            exts = [ext.lower() for ext in os.environ.get("PATHEXT", ".COM;.EXE;.BAT;.CMD").split(os.pathsep) if ext]
+            for exe in exes:
+                if os.path.splitext(exe)[1].lower() in exts:
+                    candidates.setdefault(exe.lower(), []).append(exe)
+                for ext in exts:
+                    candidates.setdefault((exe + ext).lower(), []).append(exe)
+            dirs.insert(0, os.curdir)
+        else:
+            candidates = {exe: [exe] for exe in exes}
+
+        for folder in dirs:
+            if not folder:
+                continue
+            try:
+                with os.scandir(folder) as it:
+                    for entry in it:
+                        name = entry.name.lower() if platform.system() == "Windows" else entry.name
+                        for exe in candidates.get(name, ()):
+                            if exe in self.locations:
+                                continue
+                            try:
+                                if entry.is_file() and os.access(entry.path, os.X_OK):
+                                    self.locations[exe] = entry.path
+                            except OSError:
+                                pass
+            except OSError:
+                continue
+            if len(self.locations) == len(exes):
+                break
+
+    def which(self, exe):
+        return self.locations.get(exe)
@@ -0,0 +1,40 @@
+import hashlib
+
+
+class TreeFingerprint(object):
+    """
+    Fingerprint of the files in a project folder which does not depend on the order they are read in: the sum
+    (modulo 2**128) of a hash of the relative path, size and identity of each file, where the identity is the
+    git blob id for unchanged tracked files (so a fresh checkout of the same commit matches) or otherwise the
+    modification time. Files can be added and removed in any order, so a fingerprint restored from a baseline
+    can be updated for the changed paths only.
+    """
+    modulus = 1 << 128
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+
+    @staticmethod
+    def element(relpath, size, identity):
+        digest = hashlib.blake2b("{}\0{}\0{}".format(relpath, size, identity).encode("utf-8", "surrogateescape"),
+                                 digest_size=16).digest()
+        return int.from_bytes(digest, "big")
+
+    def add(self, element):
+        self.total = (self.total + element) % self.modulus
+        self.count += 1
+
+    def remove(self, element):
+        self.total = (self.total - element) % self.modulus
+        self.count -= 1
+
+    def digest(self):
+        return "{:032x}".format(self.total)
+
+    def to_state(self):
+        return {'total': self.digest(), 'count': self.count}
+
+    def load_state(self, state):
+        self.total = int(state['total'], 16)
+        self.count = state['count']
@@ -1,6 +1,3 @@
-import texttable
-
-
 class WizardLogger(object):
     """
     This class represents the logging interface for the variable sensitivity system.
@@ -14,6 +11,7 @@ class WizardLogger(object):
         self._log_dict[topic].add(((causes, ) if type(causes) == str else tuple(causes), outcome, description))
 
     def make_table(self, sensitivity_value=None):
+        import texttable
         data_rows = []
         data_rows_no_op = []
         for topic, cod_list in self._log_dict.items():
@@ -2,6 +2,7 @@ import argparse
 import atexit
 import glob
 import io
+import itertools
 import json
 import os
 import platform
@@ -12,22 +13,46 @@ import sys
 import tarfile
 import traceback
 import zipfile
+from collections import Counter
 from datetime import datetime
 from math import trunc
 
-import magic
-from blackduck.HubRestApi import HubInstance
-
 from detect_wizard_src.Actionable import Actionable
+from detect_wizard_src.Baseline import load_baseline, save_baseline
+from detect_wizard_src.BdignorePlanner import plan_bdignores, write_bdignores
+from detect_wizard_src import BinaryTriage
 from detect_wizard_src.Configuration import Configuration, PropertyGroup, Property
-from detect_wizard_src.PathTree import PathTree
+from detect_wizard_src.ContentCache import ContentCache
+from detect_wizard_src.FileTable import FileTable
+from detect_wizard_src.GitIndex import GitIndex, git_blob_id
+from detect_wizard_src.IgnoreMatcher import IgnoreMatcher, tree_size
+from detect_wizard_src.PathTree import TreeLogWriter
+from detect_wizard_src.PrefixDict import PrefixDict
+from detect_wizard_src.SizeIndex import SizeIndex
 from detect_wizard_src.file_size_util import b_to_gb, b_to_mb
 from detect_wizard_src.TarExaminer import is_tar_docker
+from detect_wizard_src.TreeFingerprint import TreeFingerprint
 
 # Constants
 advisor_version = "1.0-Beta"
 detect_version = "6.5.0"
 detect_url = "https://detect.synopsys.com/detect8.sh" # Fix change in URL by Synopsys
+# Detect jar version run from the --detect_cache cache, and the repository it is downloaded from
+detect_jar_version = "8.11.0"
+detect_repo_url = "https://sig-repo.synopsys.com/bds-integrations/com/synopsys/integration/synopsys-detect"
+# Files written by the wizard in the project folder - not part of the tree fingerprint
+wizard_output_files = {'application-project.yml', 'detect_wizard_input.log', 'latest_detect_run.txt',
+                       'latest_detect_phases.json', 'detect_wizard_fingerprint.json'}
+# Files written by Detect (and by -b after it runs) which are not part of the tree fingerprint - .bdignore files
+# change the fingerprint through the folders they exclude from the walk rather than through their content
+detect_output_names = {'.bdignore'}
+# Notices and risk reports, written to the working folder or the configured report path
+detect_report_re = re.compile(r'_(?:Black_Duck_Notices_Report\.txt|BlackDuck_RiskReport\.pdf)$')
+# Detect output folder properties (with the environment variables which can set them) and defaults
+detect_output_properties = {'detect.output.path': os.path.join('~', 'blackduck'), 'detect.bdio.output.path': None,
+                            'detect.scan.output.path': None}
+# Detect overall status values for which a run is recorded for --skip_unchanged (the BOM was produced)
+detect_completed_statuses = ['SUCCESS', 'FAILURE_POLICY_VIOLATION']
 
 srcext_list = ['.R', '.actionscript', '.ada', '.adb', '.ads', '.aidl', '.as', '.asm', '.asp', \
                '.aspx', '.awk', '.bas', '.bat', '.bms', '.c', '.c++', '.cbl', '.cc', '.cfc', '.cfm', '.cgi', '.cls', \
@@ -120,8 +145,7 @@ detect_docker_actionable = Actionable("Detect Docker TAR", {'sensitivity >= 3 an
 
 json_splitter_actionable = Actionable("Scanfile Splitter", {'sensitivity > 1 and scan_size >= 4.5':
                                                                 (("blackduck.offline.mode: true",
-                                                                  "detect.bom.aggregate.name: detect_advisor_run_{}".format(
-                                                                      datetime.now())),
+                                                                  "detect.bom.aggregate.name: ${aggregate_name}"),
                                                                  "Scan (${scan_size}GB) will be split up to avoid reaching scanfile size limit of (5GB)")},
                                       default_description="Scan (${scan_size}GB) is within size limit (5GB) and will NOT be split.")
 
@@ -321,6 +345,8 @@ linux_only_detectors = ['clang', 'bitbake']
 
 largesize = 5000000
 hugesize = 20000000
+# Bytes read from the start of a file within a zip to find its MIME type
+zip_magic_size = 2048
 
 notinarc = 0
 inarc = 1
@@ -335,6 +361,7 @@ counts = {
     'file': [0, 0],
     'dir': [0, 0],
     'ignoredir': [0, 0],
+    'hardlink': [0, 0],
     'arc': [0, 0],
     'bin': [0, 0],
     'jar': [0, 0],
@@ -351,6 +378,7 @@ sizes = {
     'file': [0, 0, 0],
     'dir': [0, 0, 0],
     'ignoredir': [0, 0, 0],
+    'hardlink': [0, 0, 0],
     'arc': [0, 0, 0],
     'bin': [0, 0, 0],
     'jar': [0, 0, 0],
@@ -366,18 +394,56 @@ sizes = {
 package_managers_missing = []
 use_json_splitter = False
 
-src_list = []
-bin_list = []
+# Classified files (path, file type, sizes) held column-wise
+file_table = FileTable()
+# Order independent fingerprint of the files on disk (path, size and content identity) for --skip_unchanged
+tree_fingerprint = TreeFingerprint()
+# Detect output folders within the project folder, not part of the fingerprint
+detect_output_dirs = set()
 bin_large_dict = {}
-large_list = []
-huge_list = []
-arc_list = []
-jar_list = []
-other_list = []
-pkg_list = []
-docker_list = []
+# (st_dev, st_ino) -> paths of files with more than one hard link (the first is counted), and later links ->
+# the counted path
+inode_dict = {}
+hardlink_dict = {}
+# Index of the git repository containing the project folder (--git)
+git_index = None
+# Host-wide cache of classification results keyed by file content (--cache_dir)
+content_cache = None
+# On-disk store holding the scan model once it exceeds --disk_threshold entries or --disk_rss memory
+scan_store = None
+num_checked = 0
+# Package manager executables on the PATH, and the number of config files found requiring each
+tool_index = None
+tool_files = Counter()
+# Background prerequisite checks, started before the scan
+prereq_probes = None
+# Seconds the summary waits (in total) for package manager tool versions
+tool_version_wait = 5
+# URLs checked by check_prereqs()
+prereq_urls = ["https://detect.synopsys.com", "https://sig-repo.synopsys.com"]
+# Local cache of Detect jars (--detect_cache) and the verified jar Detect is run from
+detect_cache = None
+detect_jar = None
+# Signature scan exclusions chosen for --sig_budget
+sig_budget = None
+# Per-file classification records (path -> [ftype, size, size_comp, in_archive, is_lic] plus the tree fingerprint
+# element and inode (for files with more than one hard link) for files on disk), kept only when a baseline is saved or used so that the effect of checkfile() can be
+# reversed for changed paths
+file_records = None
+# Rolled-up size totals by folder for the files on disk
+size_index = SizeIndex()
+
+# Binary header information by path, and BDBA binary pack volumes and packing statistics
+binary_triage_dict = {}
+# Binary path -> (sha1 hex digest, size) for the binaries hashed by the triage, re-used by the binary pack
+binary_hashes = {}
+binpack = None
+binpack_stats = ""
 
 bdignore_list = []
+allbin_dir_list = []
+# Ignored folders are not walked, so their size is only known if --ignored_size is used
+ignored_size_known = True
 
 det_dict = {}
 detectors_list = []
@@ -387,9 +453,10 @@ crc_dict = {}
 dup_dir_dict = {}
 dup_large_dict = {}
 
-dir_dict = {}
+# Records by path which are removed by sub-tree for changed paths - PrefixDict lists the keys below a path
+dir_dict = PrefixDict()
 large_dict = {}
-arc_files_dict = {}
+arc_files_dict = PrefixDict()
 
 messages = ""
 recs_msgs_dict = {
@@ -481,7 +548,50 @@ parser.add_argument('-hv', '--hub_version', help="Hub Project Version")
 parser.add_argument('-t', '--trust_cert', help="Automatically trust Black Duck cert")
 parser.add_argument('-bdba', '--binary', help="Enable BDBA integration in detect scan (If license is available).",
                     action='store_true')
-args = parser.parse_args()
+parser.add_argument('--bdba_budget', help="Maximum size (MB) of binaries sent to BDBA - binaries are chosen by analysis value",
+                    type=float, default=0)
+parser.add_argument('--bdba_volume_size', help="Split the BDBA binary pack into volumes of at most this size (MB)",
+                    type=float, default=0)
+parser.add_argument('--sig_budget', help="Exclude folders from the signature scan to bring its size within this budget (MB) - binary-only, duplicate, generated and test/sample folders are excluded first",
+                    type=float, default=0)
+parser.add_argument('--expand_archives', help="Read the files within zip, jar, ear and war archives (including nested archives)",
+                    action='store_true')
+parser.add_argument('--archive_max_entries', help="Maximum number of files read from each archive with --expand_archives (default 100000)",
+                    type=int, default=100000)
+parser.add_argument('--archive_max_size', help="Maximum size (MB) of data read from each archive with --expand_archives (default 512)",
+                    type=float, default=512)
+parser.add_argument('--cache_dir', help="Folder for a cache of file classification results which can be shared by all projects on this host")
+parser.add_argument('--cache_max_size', help="Maximum size (MB) of the --cache_dir cache (default 1024)", type=float,
+                    default=1024)
+parser.add_argument('--cache_max_age', help="Remove --cache_dir cache records not used for this many days (default 30)",
+                    type=float, default=30)
+parser.add_argument('--disk_threshold', help="Move the scan model to an on-disk store when the number of files and folders reaches this (default 5000000, 0 = never)",
+                    type=int, default=5000000)
+parser.add_argument('--disk_rss', help="Move the scan model to an on-disk store when memory use reaches this (MB, default 3072, 0 = never) - the file table stays in memory and grows by about 50 bytes per file after the move",
+                    type=float, default=3072)
+parser.add_argument('--disk_dir', help="Folder for the on-disk scan model store (default is the system temporary folder)")
+parser.add_argument('--prereq_ttl', help="Re-use the results of prerequisite checks (java version, connections, tool versions) for this many seconds (default 3600, 0 = always check)",
+                    type=float, default=3600)
+parser.add_argument('--detect_cache', help="Run Detect with java from a cached jar in this folder (downloaded once and checked before each run) rather than the Detect script")
+parser.add_argument('--detect_version', help="Version of the Detect jar used with --detect_cache (default {})".format(detect_jar_version),
+                    default=detect_jar_version)
+parser.add_argument('--detect_repo', help="Base URL (http, https or file) the --detect_cache jars are downloaded from (default {})".format(detect_repo_url),
+                    default=detect_repo_url)
+parser.add_argument('--skip_unchanged', help="Do not run Detect if the project folder and config are unchanged since the last completed Detect run ('signature' runs Detect without the signature and binary scans)",
+                    nargs='?', const='detect', choices=['detect', 'signature'])
+parser.add_argument('--git', help="Use the local git index as content identity for tracked files in duplicate detection",
+                    action='store_true')
+parser.add_argument('--ignore', help="Glob pattern of files or folders to ignore (can be repeated) - patterns containing '/' are relative to the project folder",
+                    action='append', default=[])
+parser.add_argument('--ignored_size', help="Total the size of ignored folders (otherwise they are not read)",
+                    action='store_true')
+parser.add_argument('--save_baseline', help="Save the results of reading the project folder to this file (gzip compressed if it ends in .gz)")
+parser.add_argument('--baseline', help="Start from the results saved by --save_baseline and only read the paths given by --changed_paths")
+parser.add_argument('--changed_paths', help="File listing the paths added, changed or removed since the baseline, one per line ('-' for stdin)")
+parser.add_argument('--what_if', help="Evaluate all sensitivity/focus values against this scan and print a comparison table",
+                    action='store_true')
+# Parsed in run() so that importing this module does no work
+args = None
 
 
 def process_tar_entry(tinfo: tarfile.TarInfo, tarpath, dirdepth, tar):
@@ -503,6 +613,8 @@ def process_tar_entry(tinfo: tarfile.TarInfo, tarpath, dirdepth, tar):
         dir_dict[tdir]['size'] = tinfo.size
         dir_dict[tdir]['depth'] = dirdepth
         dir_dict[tdir]['filenamesstring'] = tinfo.name + ";"
+        dir_dict[tdir]['exts'] = Counter()
+        dir_dict[tdir]['ftypes'] = Counter()
     else:
         dir_dict[tdir]['num_entries'] += 1
         dir_dict[tdir]['size'] += tinfo.size
@@ -510,8 +622,10 @@ def process_tar_entry(tinfo: tarfile.TarInfo, tarpath, dirdepth, tar):
         dir_dict[tdir]['filenamesstring'] += tinfo.name + ";"
     arc_files_dict[fullpath] = get_crc_file(tar.extractfile(tinfo.name))
     # todo the two sizes won't work so well like that
-    checkfile(tinfo.name, fullpath, tinfo.size, tinfo.size, dirdepth, True,
-              filebuff=tar.extractfile(tinfo.name).read())
+    ftype = checkfile(tinfo.name, fullpath, tinfo.size, tinfo.size, dirdepth, True,
+                      filebuff=tar.extractfile(tinfo.name).read())
+    dir_dict[tdir]['exts'][os.path.splitext(tinfo.name)[1]] += 1
+    dir_dict[tdir]['ftypes'][ftype] += 1
     return dirdepth
 
 
@@ -559,32 +673,44 @@ def process_nested_tar(t, tarpath, tardepth, dirdepth):
         messages += "WARNING: Can't open nested tar {} (Skipped)\n".format(tarpath)
 
 
-def process_nested_zip(z, zippath, zipdepth, dirdepth):
-    global max_arc_depth
-    global messages
-
-    zipdepth += 1
-    if zipdepth > max_arc_depth:
-        max_arc_depth = zipdepth
-
-    # print("ZIP:{}:{}".format(zipdepth, zippath))
-    z2_filedata = io.BytesIO(z.read())
-    try:
-        with zipfile.ZipFile(z2_filedata) as nz:
-            for zinfo in nz.infolist():
-                dirdepth = process_zip_entry(zinfo, zippath, dirdepth, nz)
-                if os.path.splitext(zinfo.filename)[1] in supported_zipext_list:
-                    with nz.open(zinfo.filename) as z2:
-                        process_nested_zip(z2, zippath + "##" + zinfo.filename, zipdepth, dirdepth)
-    except:
-        messages += "WARNING: Can't open nested zip {} (Skipped)\n".format(zippath)
-
-
-def process_zip_entry(zinfo, zippath, dirdepth, z):
-    # print("ENTRY:" + zippath + "##" + zinfo.filename)
-    fullpath = zippath + "##" + zinfo.filename
-    odir = zinfo.filename
-    dir = os.path.dirname(zinfo.filename)
+def read_zip_summary(zfile, arcpath, zipdepth, summary):
+    """
+    Add the files within a zip (and zips nested within it) to summary - arcpath is the path of a nested zip.
+    Only the start of each file is read to find its MIME type (nested zips are read in full), and reading stops
+    once --archive_max_entries files or --archive_max_size bytes have been read from the archive.
+    """
+    import magic
+    max_read = args.archive_max_size * 1000000
+    with zipfile.ZipFile(zfile) as z:
+        for zinfo in z.infolist():
+            if zinfo.is_dir():
+                continue
+            nested = os.path.splitext(zinfo.filename)[1] in supported_zipext_list
+            read_size = zinfo.file_size if nested else min(zinfo.file_size, zip_magic_size)
+            if len(summary['entries']) >= args.archive_max_entries or summary['read'] + read_size > max_read:
+                summary['truncated'] = True
+                return
+            with z.open(zinfo) as entry:
+                filebuff = entry.read(read_size)
+            summary['read'] += read_size
+            summary['entries'].append([arcpath, zinfo.filename, zinfo.file_size, zinfo.compress_size, zinfo.CRC,
+                                       magic.from_buffer(filebuff, mime=True)])
+            summary['depth'] = max(summary['depth'], zipdepth)
+            if nested:
+                nestedpath = arcpath + "##" + zinfo.filename if arcpath else zinfo.filename
+                try:
+                    read_zip_summary(io.BytesIO(filebuff), nestedpath, zipdepth + 1, summary)
+                except Exception:
+                    summary['skipped'].append(nestedpath)
+                if summary['truncated']:
+                    return
+
+
+def process_zip_entry(filename, file_size, compress_size, crc, mime, zippath, dirdepth):
+    # print("ENTRY:" + zippath + "##" + filename)
+    fullpath = zippath + "##" + filename
+    odir = filename
+    dir = os.path.dirname(filename)
     depthinzip = 0
     while dir != odir:
         depthinzip += 1
@@ -592,56 +718,100 @@ def process_zip_entry(zinfo, zippath, dirdepth, z):
         dir = os.path.dirname(dir)
 
     dirdepth = dirdepth + depthinzip
-    tdir = zippath + "##" + os.path.dirname(zinfo.filename)
+    tdir = zippath + "##" + os.path.dirname(filename)
     if tdir not in dir_dict.keys():
         counts['dir'][inarc] += 1
         dir_dict[tdir] = {}
         dir_dict[tdir]['num_entries'] = 1
-        dir_dict[tdir]['size'] = zinfo.file_size
+        dir_dict[tdir]['size'] = file_size
         dir_dict[tdir]['depth'] = dirdepth
-        dir_dict[tdir]['filenamesstring'] = zinfo.filename + ";"
+        dir_dict[tdir]['filenamesstring'] = filename + ";"
+        dir_dict[tdir]['exts'] = Counter()
+        dir_dict[tdir]['ftypes'] = Counter()
     else:
         dir_dict[tdir]['num_entries'] += 1
-        dir_dict[tdir]['size'] += zinfo.file_size
+        dir_dict[tdir]['size'] += file_size
         dir_dict[tdir]['depth'] = dirdepth
-        dir_dict[tdir]['filenamesstring'] += zinfo.filename + ";"
+        dir_dict[tdir]['filenamesstring'] += filename + ";"
 
-    arc_files_dict[fullpath] = zinfo.CRC
-    checkfile(zinfo.filename, fullpath, zinfo.file_size, zinfo.compress_size, dirdepth, True,
-              filebuff=z.open(zinfo.filename, 'rb').read())
+    arc_files_dict[fullpath] = crc
+    ftype = checkfile(filename, fullpath, file_size, compress_size, dirdepth, True, mime=mime)
+    dir_dict[tdir]['exts'][os.path.splitext(filename)[1]] += 1
+    dir_dict[tdir]['ftypes'][ftype] += 1
     return dirdepth
 
 
-def process_zip(zippath, zipdepth, dirdepth):
+def process_zip(zippath, size, dirdepth):
     global max_arc_depth
     global messages
 
-    zipdepth += 1
-    if zipdepth > max_arc_depth:
-        max_arc_depth = zipdepth
-
-    # print("ZIP:{}:{}".format(zipdepth, zippath))
+    # The summary of the files within the zip is read from the content cache if the same zip has been seen
+    key = content_key(zippath, size, compute=True)
+    summary = content_cache.get(key, 'zip') if key is not None else None
+    if summary is None:
+        summary = {'depth': 0, 'entries': [], 'skipped': [], 'read': 0, 'truncated': False}
+        try:
+            read_zip_summary(zippath, "", 1, summary)
+        except Exception:
+            messages += "WARNING: Can't open zip {} (Skipped)\n".format(zippath)
+            return
+        if key is not None and not summary['truncated']:
+            content_cache.put(key, 'zip', summary)
+
+    if summary['depth'] > max_arc_depth:
+        max_arc_depth = summary['depth']
+    for arcpath, filename, file_size, compress_size, crc, mime in summary['entries']:
+        process_zip_entry(filename, file_size, compress_size, crc, mime,
+                          zippath + "##" + arcpath if arcpath else zippath, dirdepth)
+    for arcpath in summary['skipped']:
+        messages += "WARNING: Can't open nested zip {} (Skipped)\n".format(zippath + "##" + arcpath)
+    if summary.get('truncated'):
+        messages += "WARNING: Only the first {} files of zip {} were read (--archive_max_entries/--archive_max_size)\n".format(
+            len(summary['entries']), zippath)
+
+
+def content_key(path, size, compute=False):
+    """
+    Content cache key for a file on disk - from the git index for unchanged tracked files (without reading the
+    file), otherwise computed from the file content if compute is set. Returns None if there is no key.
+    """
+    if content_cache is None:
+        return None
     try:
-        with zipfile.ZipFile(zippath) as z:
-            for zinfo in z.infolist():
-                if zinfo.is_dir():
-                    continue
-                fullpath = zippath + "##" + zinfo.filename
-                process_zip_entry(zinfo, zippath, dirdepth)
-                if os.path.splitext(zinfo.filename)[1] in supported_zipext_list:
-                    with z.open(zinfo.filename) as z2:
-                        process_nested_zip(z2, fullpath, zipdepth, dirdepth)
-    except:
-        messages += "WARNING: Can't open zip {} (Skipped)\n".format(zippath)
+        blob_id = git_index.tracked_blob_id(path) if git_index is not None else None
+        if blob_id is None and compute:
+            blob_id = git_blob_id(path)
+    except OSError:
+        return None
+    if blob_id is None:
+        return None
+    return ContentCache.key(size, blob_id)
+
+
+def file_magic(path, size):
+    # MIME type of a file on disk, from the content cache where the file content is known
+    key = content_key(path, size)
+    mime = content_cache.get(key, 'magic') if key is not None else None
+    if mime is None:
+        import magic
+        mime = magic.from_file(path, mime=True)
+        if key is not None:
+            content_cache.put(key, 'magic', mime)
+    return mime
 
 
-def checkfile(name, path, size, size_comp, dirdepth, in_archive, filebuff=None):
+def checkfile(name, path, size, size_comp, dirdepth, in_archive, filebuff=None, mime=None):
+    global num_checked
 
     ext = os.path.splitext(name)[1]
-    if filebuff is not None:
+    is_lic = False
+    if mime is not None:
+        magic_result = mime
+    elif filebuff is not None:
+        import magic
         magic_result = magic.from_buffer(filebuff, mime=True)
     else:
-        magic_result = magic.from_file(path, mime=True)
+        magic_result = file_magic(path, size)
 
     if ext != ".zip":
         if not in_archive:
@@ -652,7 +822,6 @@ def checkfile(name, path, size, size_comp, dirdepth, in_archive, filebuff=None):
             sizes['file'][inarcunc] += size
             sizes['file'][inarccomp] += size_comp
         if size > hugesize:
-            huge_list.append(path)
             large_dict[path] = size
             if not in_archive:
                 counts['huge'][notinarc] += 1
@@ -662,7 +831,6 @@ def checkfile(name, path, size, size_comp, dirdepth, in_archive, filebuff=None):
                 sizes['huge'][inarcunc] += size
                 sizes['huge'][inarccomp] += size_comp
         elif size > largesize:
-            large_list.append(path)
             large_dict[path] = size
             if not in_archive:
                 counts['large'][notinarc] += 1
@@ -677,24 +845,21 @@ def checkfile(name, path, size, size_comp, dirdepth, in_archive, filebuff=None):
             det_dict[path] = dirdepth
         ftype = 'det'
     elif os.path.basename(name) in lic_list:
-        other_list.append(path)
         ftype = 'other'
         counts['lic'][notinarc] += 1
+        is_lic = True
 
     if ext in detectors_ext_dict.keys():
         if not in_archive:
             det_dict[path] = dirdepth
         ftype = 'det'
     elif ext in srcext_list:
-        src_list.append(path)
         ftype = 'detect_wizard_src'
     elif ext in jarext_list:
-        jar_list.append(path)
         ftype = 'jar'
     elif ext in binext_list or magic_result in ['application/x-mach-binary',
                                                 'application/x-dosexec',
                                                 'application/x-executable']:
-        bin_list.append(path)
         if size > largesize:
             bin_large_dict[path] = size
         ftype = 'bin'
@@ -709,14 +874,12 @@ def checkfile(name, path, size, size_comp, dirdepth, in_archive, filebuff=None):
                 if retval.outcome != "NO-OP":
                     c.str_add('docker', retval.outcome)
                     cli_msgs_dict['docker'] += retval.outcome + "\n"
-        arc_list.append(path)
         ftype = 'arc'
     elif ext in pkgext_list:
-        pkg_list.append(path)
         ftype = 'pkg'
     else:
-        other_list.append(path)
         ftype = 'other'
+    file_table.add(path, os.path.basename(name), ftype, size, size_comp, in_archive, is_lic)
 
     if not in_archive:
         counts[ftype][notinarc] += 1
@@ -728,78 +891,513 @@ def checkfile(name, path, size, size_comp, dirdepth, in_archive, filebuff=None):
             sizes[ftype][inarccomp] += size
         else:
             sizes[ftype][inarccomp] += size_comp
+    if file_records is not None:
+        file_records[path] = [ftype, size, size_comp, in_archive, is_lic]
+    num_checked += 1
+    if scan_store is None and num_checked % 10000 == 0 and model_too_large():
+        spill_scan_model()
     return (ftype)
 
 
-def process_dir(path, dirdepth, ignore):
+def rss_mb():
+    # Resident memory of this process in MB, or 0 if it cannot be determined
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1000000
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    # Peak rather than current memory - ru_maxrss is in bytes on macOS and KB elsewhere
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1000000 if platform.system() == "Darwin" else maxrss / 1000
+
+
+def model_too_large():
+    if args.disk_threshold > 0 and num_checked + len(dir_dict) >= args.disk_threshold:
+        return True
+    return args.disk_rss > 0 and rss_mb() >= args.disk_rss
+
+
+def decode_dir(ddict):
+    if 'exts' in ddict:
+        ddict['exts'] = Counter(ddict['exts'])
+        ddict['ftypes'] = Counter(ddict['ftypes'])
+    return ddict
+
+
+# Keys of inode_dict in the on-disk store
+inode_key_codec = (lambda inode: "{}:{}".format(*inode), lambda key: tuple(int(part) for part in key.split(':')))
+
+
+def spill_scan_model():
+    # Move the per-folder and per-file parts of the scan model to an on-disk store for the rest of the run. The
+    # file table (compact columns - a few tens of bytes per file plus its name), the folder prefixes it interns
+    # and the tree fingerprint (a fixed size sum) stay in memory
+    from detect_wizard_src.ScanStore import ScanStore
+    global scan_store
+    global dir_dict, arc_files_dict, large_dict, file_records, det_dict, inode_dict, hardlink_dict
+
+    scan_store = ScanStore(args.disk_dir)
+    dir_dict = scan_store.dict('dir_dict', dir_dict, decode=decode_dir)
+    arc_files_dict = scan_store.dict('arc_files_dict', arc_files_dict)
+    large_dict = scan_store.dict('large_dict', large_dict)
+    det_dict = scan_store.dict('det_dict', det_dict)
+    inode_dict = scan_store.dict('inode_dict', inode_dict, key_codec=inode_key_codec)
+    hardlink_dict = scan_store.dict('hardlink_dict', hardlink_dict)
+    size_index.folders = scan_store.dict('size_index', size_index.folders)
+    if file_records is not None:
+        file_records = scan_store.dict('file_records', file_records)
+
+
+def uncheckfile(path, record):
+    # Reverse the effect of checkfile() for a file which has changed or been removed
+    ftype, size, size_comp, in_archive, is_lic = record[:5]
+    arc = inarc if in_archive else notinarc
+    if os.path.splitext(path)[1] != ".zip":
+        counts['file'][arc] -= 1
+        if not in_archive:
+            sizes['file'][notinarc] -= size
+        else:
+            sizes['file'][inarcunc] -= size
+            sizes['file'][inarccomp] -= size_comp
+        for sizetype, limit in [('huge', hugesize), ('large', largesize)]:
+            if size > limit:
+                counts[sizetype][arc] -= 1
+                if not in_archive:
+                    sizes[sizetype][notinarc] -= size
+                else:
+                    sizes[sizetype][inarcunc] -= size
+                    sizes[sizetype][inarccomp] -= size_comp
+                break
+        large_dict.pop(path, None)
+    det_dict.pop(path, None)
+    bin_large_dict.pop(path, None)
+    if is_lic:
+        counts['lic'][notinarc] -= 1
+    file_table.remove(path)
+
+    counts[ftype][arc] -= 1
+    if not in_archive:
+        sizes[ftype][notinarc] -= size
+    else:
+        sizes[ftype][inarcunc] -= size
+        sizes[ftype][inarccomp] -= size if size_comp == 0 else size_comp
+
+
+def detect_output_folders():
+    # Folders within the project folder which Detect writes to (from the project config or the environment)
+    folders = set()
+    scanfolder = os.path.abspath(args.scanfolder)
+    for prop_name, default in detect_output_properties.items():
+        prop = c.get_prop(prop_name)
+        value = os.environ.get(prop_name.upper().replace('.', '_'))
+        if prop is not None and not prop.is_commented:
+            value = prop.value
+        value = value or default
+        if not value:
+            continue
+        folder = os.path.abspath(os.path.expanduser(value.strip("'\"")))
+        if folder != scanfolder and folder.startswith(scanfolder.rstrip(os.sep) + os.sep):
+            folders.add(os.path.join(args.scanfolder, os.path.relpath(folder, scanfolder)))
+    return folders
+
+
+def fingerprint_element(name, fpath, file_stat, folder):
+    # Tree fingerprint element of a file on disk, or None for the files the wizard and Detect write in the
+    # project folder
+    if folder == args.scanfolder and (name in wizard_output_files or
+                                      (name.startswith("binary_files") and name.endswith(".zip"))):
+        return None
+    if name in detect_output_names or detect_report_re.search(name):
+        return None
+    if detect_output_dirs and any(fpath.startswith(dpath + os.sep) for dpath in detect_output_dirs):
+        return None
+    identity = None
+    if git_index is not None:
+        try:
+            identity = git_index.tracked_blob_id(fpath, file_stat)
+            if identity is None and git_index.is_tracked(fpath):
+                # Tracked files can be racily clean after a fresh checkout - hashed rather than using the mtime
+                identity = git_index.content_id(fpath)
+        except OSError:
+            identity = None
+    if identity is None:
+        identity = file_stat.st_mtime_ns
+    return TreeFingerprint.element(fpath[len(args.scanfolder):], file_stat.st_size, identity)
+
+
+def process_file(name, fpath, file_stat, dirdepth, folder):
+    # Classify a file on disk in folder - returns the file type, or None for a further hard link to a file already seen
+    file_size = file_stat.st_size
+    element = fingerprint_element(name, fpath, file_stat, folder)
+    if element is not None:
+        tree_fingerprint.add(element)
+    inode = None
+    if file_stat.st_nlink > 1 and file_stat.st_ino:
+        # Further hard links to a file already seen are known duplicates - not counted or read
+        inode = (file_stat.st_dev, file_stat.st_ino)
+        if inode in inode_dict:
+            inode_dict[inode].append(fpath)
+            hardlink_dict[fpath] = inode_dict[inode][0]
+            counts['hardlink'][notinarc] += 1
+            sizes['hardlink'][notinarc] += file_size
+            if file_records is not None:
+                file_records[fpath] = ['hardlink', file_size, 0, False, False, element, inode]
+            return None
+        inode_dict[inode] = [fpath]
+    return count_file(name, fpath, file_size, dirdepth, folder, element, inode)
+
+
+def count_file(name, fpath, file_size, dirdepth, folder, element, inode):
+    # Classify and count a file on disk (the first of its hard links) - returns the file type
+    ftype = checkfile(name, fpath, file_size, 0, dirdepth, False)
+    if file_records is not None:
+        file_records[fpath] += [element, inode]
+    size_index.add_file(folder, ftype, file_size, fpath)
+    if args.expand_archives and os.path.splitext(name)[1] in supported_zipext_list:
+        process_zip(fpath, file_size, dirdepth)
+    #if ext in supported_tar_list:
+    #    process_tar(fpath, 0, dirdepth)
+    return ftype
+
+
+def process_dir(path, dirdepth, matcher, tree_log=None, tree_prefix=""):
+    global ignored_size_known
     dir_size = 0
     dir_entries = 0
-    filenames_string = ""
+    filenames = []
+    # Folder composition by extension and file type, maintained during the walk
+    exts = Counter()
+    ftypes = Counter()
     global messages
 
     dir_dict[path] = {}
     dirdepth += 1
+    size_index.add_folder(path, dirdepth)
 
-    all_bin = False
     try:
-        ignore_list = []
-        if not ignore:
-            # Check whether .bdignore exists
-            bdignore_file = os.path.join(path, ".bdignore")
-            if os.path.exists(bdignore_file):
-                b = open(bdignore_file, "r")
-                lines = b.readlines()
-                for bline in lines:
-                    ignore_list.append(bline[1:len(bline) - 2])
-                b.close()
-
-        for entry in os.scandir(path):
-            ignorethis = False
-            if entry.name in ignored_files_and_directories:
-                ignorethis = True
-            dir_entries += 1
-            filenames_string += entry.name + ";"
-            if entry.is_dir(follow_symlinks=False):
-                if ignore or os.path.basename(entry.path) in ignore_list or ignorethis:
-                    ignorethis = True
-                    counts['ignoredir'][notinarc] += 1
-                else:
-                    counts['dir'][notinarc] += 1
-                this_size = process_dir(entry.path, dirdepth, ignorethis)
-                dir_size += this_size
-                if ignorethis:
-                    sizes['ignoredir'][notinarc] += this_size
+        with os.scandir(path) as scandir_it:
+            if tree_log is not None:
+                # Logged entries are visited in file tree order so the tree log is written from this walk
+                ordered_entries = tree_log.entries(scandir_it, tree_prefix, dirdepth,
+                                                   ignored=lambda e: matcher.matches(e.name, e.is_dir(follow_symlinks=False)))
             else:
-                if not ignore or ignorethis:
-                    ftype = checkfile(entry.name, entry.path, entry.stat(follow_symlinks=False).st_size, 0, dirdepth,
-                                      False)
-                    if ftype == 'bin':
-                        if dir_entries == 1:
-                            all_bin = True
-                    else:
-                        all_bin = False
-                    ext = os.path.splitext(entry.name)[1]
-                    if ext in supported_zipext_list:
-                        process_zip(entry.path, 0, dirdepth)
-                    #if ext in supported_tar_list:
-                    #    process_tar(entry.path, 0, dirdepth)
+                ordered_entries = ((entry, None) for entry in scandir_it)
+
+            for entry, child_prefix in ordered_entries:
+                is_dir = entry.is_dir(follow_symlinks=False)
+                if matcher.matches(entry.name, is_dir):
+                    # Ignored folders are pruned here rather than walked
+                    if is_dir:
+                        counts['ignoredir'][notinarc] += 1
+                        if args.ignored_size:
+                            sizes['ignoredir'][notinarc] += tree_size(entry.path)
+                        else:
+                            ignored_size_known = False
+                    continue
 
-                dir_size += entry.stat(follow_symlinks=False).st_size
+                dir_entries += 1
+                filenames.append(entry.name)
+                if is_dir:
+                    counts['dir'][notinarc] += 1
+                    ftypes['dir'] += 1
+                    dir_size += process_dir(entry.path, dirdepth, matcher.for_folder(entry.name, entry.path),
+                                            tree_log if child_prefix is not None else None, child_prefix)
+                else:
+                    file_stat = entry.stat(follow_symlinks=False)
+                    ftype = process_file(entry.name, entry.path, file_stat, dirdepth, path)
+                    if ftype is None:
+                        continue
+                    exts[os.path.splitext(entry.name)[1]] += 1
+                    ftypes[ftype] += 1
+                    dir_size += file_stat.st_size
 
     except OSError:
         messages += "ERROR: Unable to open folder {}\n".format(path)
         return 0
 
-    if not ignore:
-        dir_dict[path]['num_entries'] = dir_entries
-        dir_dict[path]['size'] = dir_size
-        dir_dict[path]['depth'] = dirdepth
-        dir_dict[path]['filenamesstring'] = filenames_string
-    if all_bin and path.find("##") < 0:
+    dir_dict[path]['num_entries'] = dir_entries
+    dir_dict[path]['size'] = dir_size
+    dir_dict[path]['depth'] = dirdepth
+    # Names are sorted so that identical folders compare equal whatever order they were listed in
+    dir_dict[path]['filenamesstring'] = "".join(name + ";" for name in sorted(filenames))
+    dir_dict[path]['exts'] = exts
+    dir_dict[path]['ftypes'] = ftypes
+    if binary_only(ftypes) and path.find("##") < 0:
         bdignore_list.append(path)
+        allbin_dir_list.append(path)
     return dir_size
 
 
+def baseline_state():
+    # Results of the walk saved by --save_baseline (tables in the on-disk store are read into memory)
+    state = {'scanfolder': os.path.abspath(args.scanfolder), 'counts': counts, 'sizes': sizes,
+            'max_arc_depth': max_arc_depth, 'ignored_size_known': ignored_size_known, 'dir_dict': dir_dict,
+            'large_dict': large_dict, 'bin_large_dict': bin_large_dict, 'arc_files_dict': arc_files_dict,
+            'det_dict': det_dict, 'file_table': file_table.to_state(), 'allbin_dir_list': allbin_dir_list,
+            'inode_dict': inode_dict, 'hardlink_dict': hardlink_dict, 'size_index': size_index.folders,
+            'largest_files': size_index.largest_files, 'file_records': file_records,
+            'tree_fingerprint': tree_fingerprint.to_state(), 'expand_archives': args.expand_archives}
+    if scan_store is not None:
+        from detect_wizard_src.ScanStore import DiskDict
+        for name, value in state.items():
+            if isinstance(value, DiskDict):
+                state[name] = dict(value.items())
+    return state
+
+
+def restore_baseline(state):
+    # Load a saved walk into the module globals (updated in place)
+    global max_arc_depth
+    global ignored_size_known
+
+    for name, gdict in [('counts', counts), ('sizes', sizes), ('dir_dict', dir_dict), ('large_dict', large_dict),
+                        ('bin_large_dict', bin_large_dict), ('arc_files_dict', arc_files_dict), ('det_dict', det_dict),
+                        ('inode_dict', inode_dict), ('hardlink_dict', hardlink_dict), ('file_records', file_records)]:
+        gdict.clear()
+        gdict.update(state[name])
+    file_table.load_state(state['file_table'])
+    tree_fingerprint.load_state(state['tree_fingerprint'])
+    allbin_dir_list[:] = state['allbin_dir_list']
+    max_arc_depth = state['max_arc_depth']
+    ignored_size_known = state['ignored_size_known']
+    size_index.folders = state['size_index']
+    size_index.largest_files = state['largest_files']
+    size_index.rolled_up = False
+
+
+def read_changed_paths(fname):
+    # Changed paths one per line - relative to the project folder or absolute ('-' reads stdin)
+    if fname == '-':
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(fname, "r") as p:
+            lines = p.read().splitlines()
+    return [line.strip() for line in lines if line.strip()]
+
+
+def walk_path(root, relpath):
+    # Path of relpath below root built as the walk builds it (so it matches the dir_dict keys)
+    path = root
+    for name in relpath.replace(os.sep, '/').split('/'):
+        if name not in ['', '.']:
+            path = os.path.join(path, name)
+    return path
+
+
+def matcher_for(root, root_matcher, folder):
+    # Ignore matcher for the entries of folder, or None if folder is ignored
+    matcher = root_matcher
+    path = root
+    for name in os.path.relpath(folder, root).split(os.sep):
+        if name == '.':
+            continue
+        if matcher.matches(name, True):
+            return None
+        path = os.path.join(path, name)
+        matcher = matcher.for_folder(name, path)
+    return matcher
+
+
+def update_folder(folder, name, ext, ftype, size, delta):
+    # Add (delta 1) or remove (delta -1) the entry name of folder, adjusting the sizes of all parent folders
+    ddict = dir_dict[folder]
+    ddict['num_entries'] += delta
+    names = set(n for n in ddict['filenamesstring'].split(";") if n)
+    if delta > 0:
+        names.add(name)
+    else:
+        names.discard(name)
+    ddict['filenamesstring'] = "".join(n + ";" for n in sorted(names))
+    if ftype is None:
+        # Further hard links are listed but not counted
+        return
+    if ftype != 'dir':
+        ddict['exts'][ext] += delta
+    ddict['ftypes'][ftype] += delta
+    if delta < 0:
+        # Drop the counts of extensions and types no longer present
+        ddict['exts'] = +ddict['exts']
+        ddict['ftypes'] = +ddict['ftypes']
+    while True:
+        dir_dict[folder]['size'] += delta * size
+        parent = os.path.dirname(folder)
+        if parent == folder or parent not in dir_dict:
+            break
+        folder = parent
+
+
+def ensure_folder(folder):
+    # Create dir_dict records for a new folder and any new parent folders
+    if folder in dir_dict:
+        return
+    parent = os.path.dirname(folder)
+    ensure_folder(parent)
+    depth = dir_dict[parent]['depth'] + 1
+    dir_dict[folder] = {'num_entries': 0, 'size': 0, 'depth': depth, 'filenamesstring': "",
+                        'exts': Counter(), 'ftypes': Counter()}
+    size_index.add_folder(folder, depth)
+    counts['dir'][notinarc] += 1
+    update_folder(parent, os.path.basename(folder), '', 'dir', 0, 1)
+
+
+def remove_archive_members(path):
+    # Remove the records of files and folders within an archive (or within all archives below a folder)
+    prefix = path + "##"
+    for fpath in file_records.keys_with_prefix(prefix):
+        uncheckfile(fpath, file_records.pop(fpath))
+    for dpath in dir_dict.keys_with_prefix(prefix):
+        del dir_dict[dpath]
+        counts['dir'][inarc] -= 1
+    for apath in arc_files_dict.keys_with_prefix(prefix):
+        del arc_files_dict[apath]
+
+
+def remove_link(path, size):
+    # Remove the record of a further hard link (listed in its folder but not counted)
+    del hardlink_dict[path]
+    counts['hardlink'][notinarc] -= 1
+    sizes['hardlink'][notinarc] -= size
+    update_folder(os.path.dirname(path), os.path.basename(path), None, None, 0, -1)
+
+
+def remove_file(path):
+    folder = os.path.dirname(path)
+    record = file_records.pop(path)
+    ftype, size = record[0], record[1]
+    if record[5] is not None:
+        tree_fingerprint.remove(record[5])
+    links = []
+    if record[6] is not None:
+        inode = tuple(record[6])
+        links = inode_dict[inode]
+        links.remove(path)
+        if not links:
+            del inode_dict[inode]
+    if ftype == 'hardlink':
+        remove_link(path, size)
+        return
+    uncheckfile(path, record)
+    size_index.remove_file(folder, ftype, size)
+    ext = os.path.splitext(path)[1]
+    if ext in supported_zipext_list:
+        remove_archive_members(path)
+    update_folder(folder, os.path.basename(path), ext, ftype, size, -1)
+    if links:
+        # The next remaining link is counted instead, as it would be by a full walk
+        promote_link(links)
+
+
+def promote_link(links):
+    # Count the first of links (recorded as a further hard link) as the file, and point the others at it
+    path = links[0]
+    folder = os.path.dirname(path)
+    name = os.path.basename(path)
+    record = file_records.pop(path)
+    size = record[1]
+    remove_link(path, size)
+    ftype = count_file(name, path, size, dir_dict[folder]['depth'], folder, record[5], tuple(record[6]))
+    update_folder(folder, name, os.path.splitext(name)[1], ftype, size, 1)
+    for lpath in links[1:]:
+        hardlink_dict[lpath] = path
+
+
+def remove_tree(path):
+    prefix = path + os.sep
+    for fpath in [fpath for fpath in file_records.keys_with_prefix(prefix) if fpath.find("##") < 0]:
+        remove_file(fpath)
+    for dpath in reversed(dir_dict.keys_with_prefix(prefix)):
+        del dir_dict[dpath]
+        size_index.folders.pop(dpath, None)
+        counts['dir'][notinarc] -= 1
+        if dpath in allbin_dir_list:
+            allbin_dir_list.remove(dpath)
+    parent = os.path.dirname(path)
+    size = dir_dict[path]['size']
+    del dir_dict[path]
+    size_index.folders.pop(path, None)
+    counts['dir'][notinarc] -= 1
+    if path in allbin_dir_list:
+        allbin_dir_list.remove(path)
+    update_folder(parent, os.path.basename(path), '', 'dir', size, -1)
+
+
+def add_path(root, root_matcher, path):
+    folder = os.path.dirname(path)
+    name = os.path.basename(path)
+    matcher = matcher_for(root, root_matcher, folder)
+    is_dir = os.path.isdir(path) and not os.path.islink(path)
+    if matcher is None or matcher.matches(name, is_dir):
+        return
+    ensure_folder(folder)
+    if is_dir:
+        counts['dir'][notinarc] += 1
+        size = process_dir(path, dir_dict[folder]['depth'], matcher.for_folder(name, path))
+        update_folder(folder, name, '', 'dir', size, 1)
+    else:
+        file_stat = os.stat(path, follow_symlinks=False)
+        ftype = process_file(name, path, file_stat, dir_dict[folder]['depth'], folder)
+        update_folder(folder, name, os.path.splitext(name)[1], ftype, file_stat.st_size, 1)
+
+
+def changed_walk_paths(root, changed_paths):
+    # Walk paths of the changed paths, or None if the project folder itself is listed
+    global messages
+
+    paths = set()
+    for cpath in changed_paths:
+        if os.path.isabs(cpath):
+            cpath = os.path.relpath(cpath, os.path.abspath(root))
+        cpath = os.path.normpath(cpath)
+        if cpath == '.':
+            return None
+        if cpath == '..' or cpath.startswith('..' + os.sep):
+            messages += "WARNING: Changed path {} is outside the project folder (Skipped)\n".format(cpath)
+            continue
+        paths.add(walk_path(root, cpath))
+    return paths
+
+
+def process_changed_paths(root, root_matcher, paths):
+    """
+    Update the walk loaded from a baseline for the changed (added, modified or removed) paths - the previous
+    records of each path are removed and the path is read again if it still exists.
+    """
+    folders = set()
+    for path in sorted(paths):
+        # Paths within a changed folder are read with the folder
+        if any(path.startswith(p + os.sep) for p in folders):
+            continue
+        folders.add(path)
+        if path in dir_dict:
+            remove_tree(path)
+        elif path in file_records:
+            remove_file(path)
+        if os.path.lexists(path):
+            add_path(root, root_matcher, path)
+
+    # Folders which no longer exist on disk are removed with everything recorded below them
+    for path in sorted({os.path.dirname(p) for p in folders}, reverse=True):
+        while path in dir_dict and path != root and not os.path.isdir(path):
+            remove_tree(path)
+            path = os.path.dirname(path)
+
+    # Binary-only folders are decided again for the folders containing changes
+    for path in {os.path.dirname(p) for p in folders}:
+        if path not in dir_dict:
+            continue
+        if path in allbin_dir_list:
+            allbin_dir_list.remove(path)
+        if binary_only(dir_composition(path)):
+            allbin_dir_list.append(path)
+
+    size_index.set_largest_files(file_table.largest(size_index.max_files, in_archive=False))
+    bdignore_list[:] = allbin_dir_list
+
+
 def process_largefiledups(f):
     import filecmp
 
@@ -837,6 +1435,12 @@ def process_largefiledups(f):
                         else:
                             ccrc = get_crc(cpath)
                         test = (acrc == ccrc)
+                    elif git_index is not None:
+                        # Blob ids from the git index identify unchanged tracked files without reading them
+                        try:
+                            test = git_index.same_content(apath, cpath)
+                        except OSError:
+                            test = False
                     else:
                         test = filecmp.cmp(apath, cpath, True)
 
@@ -854,6 +1458,10 @@ def process_largefiledups(f):
     if f and count == 0:
         f.write("    None\n")
 
+    if git_index is not None:
+        print(" (git blob ids: {} from index, {} computed)".format(git_index.num_reused, git_index.num_hashed),
+              end="", flush=True)
+
     return (count_dups, total_dup_size)
 
 
@@ -869,6 +1477,9 @@ def process_dirdups(f):
 
     count = 0
     ditems = len(dir_dict)
+    # Folders can only be duplicates if they have the same number of entries, size and file names, so candidate
+    # folders are grouped by these in one pass (in dict order) rather than comparing every pair of folders
+    groups = {}
     for apath, adict in dir_dict.items():
         dcount += 1
         if dcount % ((ditems // 6) + 1) == 0:
@@ -876,37 +1487,36 @@ def process_dirdups(f):
         try:
             if adict['num_entries'] == 0 or adict['size'] < hugesize:
                 continue
+            groups.setdefault((adict['num_entries'], adict['size'], adict['filenamesstring']), []).append(
+                (apath, adict['depth']))
         except:
             continue
-        dupmatch = False
-        for cpath, cdict in dir_dict.items():
-            if apath != cpath:
-                try:
-                    if adict['num_entries'] == cdict['num_entries'] and adict['size'] == cdict['size'] \
-                            and adict['filenamesstring'] == cdict['filenamesstring']:
-                        if adict['depth'] < cdict['depth']:
-                            keypath = apath
-                            valpath = cpath
-                        elif len(apath) < len(cpath):
-                            keypath = apath
-                            valpath = cpath
-                        elif apath < cpath:
-                            keypath = apath
-                            valpath = cpath
-                        else:
-                            keypath = cpath
-                            valpath = apath
-
-                        newdup = False
-                        if keypath not in tmp_dup_dir_dict.keys():
-                            newdup = True
-                        elif tmp_dup_dir_dict[keypath] != valpath:
-                            newdup = True
-                        if newdup:
-                            tmp_dup_dir_dict[keypath] = valpath
-                        break
-                except:
-                    pass
+
+    for group in groups.values():
+        for apath, adepth in group:
+            for cpath, cdepth in group:
+                if apath != cpath:
+                    if adepth < cdepth:
+                        keypath = apath
+                        valpath = cpath
+                    elif len(apath) < len(cpath):
+                        keypath = apath
+                        valpath = cpath
+                    elif apath < cpath:
+                        keypath = apath
+                        valpath = cpath
+                    else:
+                        keypath = cpath
+                        valpath = apath
+
+                    newdup = False
+                    if keypath not in tmp_dup_dir_dict.keys():
+                        newdup = True
+                    elif tmp_dup_dir_dict[keypath] != valpath:
+                        newdup = True
+                    if newdup:
+                        tmp_dup_dir_dict[keypath] = valpath
+                    break
 
     # Now remove dupdirs with matching parent folders
     for xpath in tmp_dup_dir_dict.keys():
@@ -936,27 +1546,29 @@ def process_dirdups(f):
     return (count_dupdirs, size_dupdirs)
 
 
+def dir_composition(path):
+    # Counter of the file types (and 'dir' for sub-folders) of the entries in a scanned folder
+    return dir_dict.get(path, {}).get('ftypes', Counter())
+
+
+def binary_only(composition):
+    # Whether the files of a folder (sub-folders aside) are all binaries, from its composition Counter
+    return [ftype for ftype, num in composition.items() if ftype != 'dir' and num > 0] == ['bin']
+
+
+def dir_ext_count(path, ext):
+    # Number of files with extension ext (including the '.') in a scanned folder
+    return dir_dict.get(path, {}).get('exts', {}).get(ext, 0)
+
+
 def check_singlefiles(f):
-    # Check for singleton js & other single files
+    # Check for singleton js files - .js files in folders which also contain other files or folders
     sfmatch = False
-    sf_list = []
-    for thisfile in src_list:
-        ext = os.path.splitext(thisfile)[1]
-        if ext == '.js':
-            # get dir
-            # check for .js in filenamesstring
-            thisdir = dir_dict.get(os.path.dirname(thisfile))
-            if thisfile.find("node_modules") > 0:
-                continue
-            if thisdir != None:
-                all_js = True
-                for filename in thisdir['filenamesstring'].split(';'):
-                    srcext = os.path.splitext(filename)[1]
-                    if srcext != '.js':
-                        all_js = False
-                if not all_js:
-                    sfmatch = True
-                    sf_list.append(thisfile)
+    for dpath, ddict in dir_dict.items():
+        num_js = dir_ext_count(dpath, '.js')
+        if 0 < num_js < ddict.get('num_entries', 0) and dpath.find("node_modules") < 0:
+            sfmatch = True
+            break
     if sfmatch:
         c.str_add('scan', '--detect.blackduck.signature.scanner.individual.file.matching=SOURCE')
         c.str_add('scan', "    (To include singleton .js files in signature scan for OSS matches)")
@@ -967,10 +1579,14 @@ def check_singlefiles(f):
 
 def get_crc(myfile):
     import zlib
+    global messages
     buffersize = 65536
 
     crcvalue = 0
     try:
+        key = content_key(myfile, os.path.getsize(myfile))
+        if key is not None and content_cache.get(key, 'crc') is not None:
+            return content_cache.records[key]['crc']
         with open(myfile, 'rb') as afile:
             buffr = afile.read(buffersize)
             while len(buffr) > 0:
@@ -979,6 +1595,8 @@ def get_crc(myfile):
     except:
         messages += "WARNING: Unable to open file {} to calculate CRC\n".format(myfile)
         return (0)
+    if key is not None:
+        content_cache.put(key, 'crc', crcvalue)
     return (crcvalue)
 
 
@@ -1044,12 +1662,24 @@ def print_summary(critical_only, f):
                                                                                                                'dir'][
                                                                                                                inarc])
 
-    summary += row.format("Ignored Folders", \
-                          counts['ignoredir'][notinarc], \
-                          trunc(b_to_mb(sizes['ignoredir'][notinarc])), \
-                          counts['ignoredir'][inarc], \
-                          trunc(b_to_mb(sizes['ignoredir'][inarcunc])), \
-                          trunc(b_to_mb(sizes['ignoredir'][inarccomp])))
+    if ignored_size_known:
+        summary += row.format("Ignored Folders", \
+                              counts['ignoredir'][notinarc], \
+                              trunc(b_to_mb(sizes['ignoredir'][notinarc])), \
+                              counts['ignoredir'][inarc], \
+                              trunc(b_to_mb(sizes['ignoredir'][inarcunc])), \
+                              trunc(b_to_mb(sizes['ignoredir'][inarccomp])))
+    else:
+        # Ignored folders were not read (use --ignored_size to total them)
+        summary += "{:25} {:>10,d}              N/A      {:>10,d}             N/A             N/A   \n".format(
+            "Ignored Folders", counts['ignoredir'][notinarc], counts['ignoredir'][inarc])
+
+    summary += row.format("Hard Links (not counted)", \
+                          counts['hardlink'][notinarc], \
+                          trunc(b_to_mb(sizes['hardlink'][notinarc])), \
+                          counts['hardlink'][inarc], \
+                          trunc(b_to_mb(sizes['hardlink'][inarcunc])), \
+                          trunc(b_to_mb(sizes['hardlink'][inarccomp])))
 
     summary += row.format("Source Files", \
                           counts['detect_wizard_src'][notinarc], \
@@ -1111,6 +1741,15 @@ def print_summary(critical_only, f):
 
     summary += "--------------------  --------------   --------------   -------------   -------------   -------------\n"
 
+    summary += scan_bytes_summary(10)
+    summary += hardlink_report(10)
+    summary += tool_report()
+    summary += sig_budget_report()
+    if content_cache is not None:
+        summary += "\nClassification cache hits: {}\n".format(content_cache.stats())
+    if scan_store is not None:
+        summary += "\nScan model held in on-disk store {}\n".format(scan_store.folder)
+
     #summary += rep + "\n"
 
     if not critical_only:
@@ -1119,26 +1758,174 @@ def print_summary(critical_only, f):
         f.write(summary)
 
 
+def hardlink_report(k):
+    # Further hard links (counted once - not read), listing the first k
+    if not hardlink_dict:
+        return ""
+    report = "\nHARD LINKED FILES (Counted once - not read, {:,d} links, {:,d} MB):\n".format(
+        counts['hardlink'][notinarc], trunc(b_to_mb(sizes['hardlink'][notinarc])))
+    for hpath, fpath in itertools.islice(hardlink_dict.items(), k):
+        report += "- Hard link - {}, {}\n".format(hpath, fpath)
+    if len(hardlink_dict) > k:
+        report += "- ... {:,d} more\n".format(len(hardlink_dict) - k)
+    return report
+
+
+def scan_bytes_summary(k):
+    # Heaviest folders (whole sub-tree, excluding the project folder) and largest files on disk
+    summary = "\nWHERE YOUR SCAN BYTES ARE (Largest {} folders):\n".format(k) + \
+              "{:>10} {:>10} {:>10} {:>10} {:>10} {:>10} {:>10}   {}\n".format(
+                  "Total MB", "Source MB", "Binary MB", "Archive MB", "Jar MB", "Other MB", "Files", "Folder")
+    for dpath in size_index.top_folders(k, exclude={args.scanfolder}):
+        dsizes = size_index.sizes(dpath)
+        summary += "{:>10,d} {:>10,d} {:>10,d} {:>10,d} {:>10,d} {:>10,d} {:>10,d}   {}\n".format(
+            trunc(b_to_mb(size_index.total(dpath))), *[trunc(b_to_mb(dsizes[cat])) for cat in SizeIndex.categories],
+            size_index.num_files(dpath), dpath)
+
+    summary += "\nLARGEST FILES:\n"
+    for fsize, fpath in size_index.top_files(k):
+        summary += "{:>10,d} MB   {}\n".format(trunc(b_to_mb(fsize)), fpath)
+    return summary
+
+
+def what_if_matrix(f):
+    # Re-evaluate the Actionables for every sensitivity and focus value against the results of this scan
+    scan_size = sizes['file'][notinarc] + sizes['arc'][notinarc]
+
+    dupdir_ignores = [bpath for bpath in dup_dir_dict.values() if bpath.find("##") < 0]
+    dupfile_ignores = [bpath for bpath in dup_large_dict.values() if bpath.find("##") < 0]
+
+    # Binaries are only triaged if BDBA would be invoked at the highest sensitivity
+    binzip_list = file_table.outer_paths('bin')
+    if binary_matching_actionable.evaluate(sensitivity=5, num_binaries=len(binzip_list), bin_pack_name="",
+                                           no_write=False, bdba_enable=args.binary).outcome != "NO-OP":
+        binzip_list = select_binaries(binzip_list)[0]
+    else:
+        binzip_list = []
+    bdba_size = sum(binary_triage_dict[bpath].size for bpath in binzip_list)
+
+    rows = []
+    # Focus values 'l' and 'b' are evaluated identically by all Actionables (scan_focus != "s")
+    for sensitivity in range(1, 6):
+        for focus in ['s', 'b']:
+            sig_scan = sig_scan_actionable.evaluate(sensitivity=sensitivity).outcome == "NO-OP"
+
+            ignore_list = allbin_dir_list + dupfile_ignores
+            if directory_dupes_actionable.evaluate(sensitivity=sensitivity).outcome != "NO-OP":
+                ignore_list = ignore_list + dupdir_ignores
+            plan = plan_bdignores(ignore_list, args.scanfolder, dir_dict, large_dict)
+            sig_size = scan_size - sum(size for path, size in plan) if sig_scan else 0
+
+            split = json_splitter_actionable.evaluate(sensitivity=sensitivity, scan_size=b_to_gb(sig_size),
+                                                      aggregate_name=aggregate_name()).outcome != "NO-OP"
+            bdba = binary_matching_actionable.evaluate(sensitivity=sensitivity, num_binaries=len(binzip_list),
+                                                       bin_pack_name="", no_write=False,
+                                                       bdba_enable=args.binary).outcome != "NO-OP"
+            indiv = indiv_file_match_actionable.evaluate(sensitivity=sensitivity).outcome != "NO-OP"
+            snippet = file_snippet_match_actionable.evaluate(sensitivity=sensitivity,
+                                                             scan_focus=focus).outcome != "NO-OP"
+            lic = license_search_actionable.evaluate(scan_focus=focus).outcome != "NO-OP"
+            buildless = buildless_mode_actionable.evaluate(sensitivity=sensitivity).outcome != "NO-OP"
+            depth = detector_search_depth_actionable.evaluate(sensitivity=sensitivity).outcome
+
+            current = sensitivity == args.sensitivity and (focus == args.focus or (focus == 'b' and args.focus == 'l'))
+            rows.append(["{}{}".format(sensitivity, " *" if current else ""),
+                         "s" if focus == 's' else "l/b",
+                         "Yes" if sig_scan else "No",
+                         "{:,d}".format(trunc(b_to_mb(sig_size))),
+                         "Yes" if split else "No",
+                         len(plan),
+                         "{:,d}".format(trunc(b_to_mb(bdba_size))) if bdba else "0",
+                         "Yes" if indiv else "No",
+                         "Yes" if snippet else "No",
+                         "Yes" if lic else "No",
+                         "Yes" if buildless else "No",
+                         depth])
+
+    import texttable
+    table = texttable.Texttable(max_width=140)
+    table.set_cols_align(["c", "c", "c", "r", "c", "r", "r", "c", "c", "c", "c", "c"])
+    table.header(["Sensitivity", "Focus", "Sig Scan", "Est. Sig Scan Size (MB)", "Split", "bdignored Folders",
+                  "BDBA Payload (MB)", "Indiv File Match", "Snippets", "License Search", "Buildless",
+                  "Detector Depth"])
+    table.add_rows(rows, header=False)
+
+    output = "+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++\n\n" + \
+             "WHAT-IF ANALYSIS (all sensitivity/focus values - current run marked with *):\n" + \
+             "(Signature scan size assumes .bdignore files are created with the -b option)\n\n" + \
+             table.draw() + "\n"
+    print(output)
+    if f:
+        f.write(output)
+
+
+def select_binaries(binzip_list):
+    # Returns the list of binaries for BDBA and (summary message, listing of each binary, number triaged)
+    from detect_wizard_src.BinaryPack import hash_files
+    global messages
+    new_paths = sorted(bpath for bpath in binzip_list if bpath not in binary_triage_dict)
+    for bpath in new_paths:
+        binary_triage_dict[bpath] = BinaryTriage.triage(bpath)
+    # Binaries without a build id are compared by content - hashed in parallel, and the hashes are re-used by
+    # the binary pack to find duplicates
+    hashes, errors = hash_files([bpath for bpath in new_paths if not binary_triage_dict[bpath].build_id])
+    binary_hashes.update(hashes)
+    for error in errors:
+        messages += "WARNING: {}\n".format(error)
+    for bpath, (digest, size) in hashes.items():
+        binary_triage_dict[bpath].content_hash = digest
+    infos = [binary_triage_dict[bpath] for bpath in sorted(binzip_list)]
+    selected, num_identical, num_novalue, num_over = BinaryTriage.select(infos, int(args.bdba_budget * 1000000))
+    selected_paths = [info.path for info in selected]
+
+    listing = ""
+    if infos:
+        listing = "\nBINARY TRIAGE (* = sent to BDBA):\n"
+        selected_set = set(selected_paths)
+        for info in infos:
+            listing += "{} {:>10,d} MB  {:7} {:9} {:8} {:8} {:9} value={} {} {}\n".format(
+                "*" if info.path in selected_set else " ", trunc(b_to_mb(info.size)), info.format, info.arch,
+                info.kind, info.linkage, "stripped" if info.stripped else "", info.score, info.path,
+                "; ".join(info.versions))
+
+    stats = "INFO: Binary triage selected {} of {} binaries ({:,d} of {:,d} MB) - {} identical builds, " \
+            "{} object files/static libraries and {} over budget skipped".format(
+                len(selected), len(infos), trunc(b_to_mb(sum(i.size for i in selected))),
+                trunc(b_to_mb(sum(i.size for i in infos))), num_identical, num_novalue, num_over)
+    return selected_paths, (stats, listing, len(infos))
+
+
 def pack_binaries(path_list, fname="binary_files.zip"):
+    # Returns the list of pack volume names - a single volume is named fname
+    from detect_wizard_src.BinaryPack import BinaryPack
     global binpack
+    global binpack_stats
+    global messages
     binpack = None
+    bpack = BinaryPack(args.scanfolder, fname, volume_size=int(args.bdba_volume_size * 1000000))
+    volumes = []
     try:
-        with zipfile.ZipFile(os.path.join(args.scanfolder, fname), 'w') as binzip:
-            for bin_path in path_list:
-                binzip.write(os.path.relpath(bin_path, os.curdir))
-
-    except RuntimeError:
-        traceback.print_last(file=sys.stderr)
+        volumes = bpack.pack(path_list, binary_hashes)
+    except (OSError, RuntimeError, zipfile.LargeZipFile):
+        traceback.print_exc(file=sys.stderr)
     finally:
-        binpack = fname
-        return fname
+        binpack = volumes
+    for error in bpack.errors:
+        messages += "WARNING: {}\n".format(error)
+    binpack_stats = "INFO: Binary pack contains {} files in {} volume(s) - {} duplicates skipped ({:,d} MB), " \
+                    "{:,d} MB packed to {:,d} MB ({:,d} MB saved)".format(
+                        bpack.num_files, len(volumes), bpack.num_dups, trunc(b_to_mb(bpack.dup_size)),
+                        trunc(b_to_mb(bpack.input_size)), trunc(b_to_mb(bpack.output_size)),
+                        trunc(b_to_mb(bpack.input_size - bpack.output_size)))
+    return volumes
 
 
 def signature_process(folder, f):
     use_json_splitter = False
     # test if we should exclude signature scanner
     result = sig_scan_actionable.test(sensitivity=args.sensitivity)
-    if result.outcome != "NO-OP":
+    sig_scan_excluded = result.outcome != "NO-OP"
+    if sig_scan_excluded:
         c.str_add('reqd', result.outcome)
         cli_msgs_dict['reqd'] += "{}\n".format(result.outcome)
 
@@ -1153,7 +1940,8 @@ def signature_process(folder, f):
 
     print("- Processing Signature Scan  .....", end="", flush=True)
     retval = json_splitter_actionable.test(sensitivity=args.sensitivity,
-                                           scan_size=b_to_gb(sizes['file'][notinarc] + sizes['arc'][notinarc]))
+                                           scan_size=b_to_gb(sizes['file'][notinarc] + sizes['arc'][notinarc]),
+                                           aggregate_name=aggregate_name())
     # Produce Recommendations
     if retval.outcome != "NO-OP":
         use_json_splitter = True
@@ -1189,23 +1977,41 @@ def signature_process(folder, f):
 
     if sizes['bin'][notinarc] + sizes['bin'][inarc] > 20000000:
         recs_msgs_dict['imp'] += "- IMPORTANT: Large amount of data ({:>,d} MB) in {} binary files found\n".format(
-            trunc((sizes['bin'][notinarc] + sizes['bin'][inarc]) / 1000000), len(bin_list)) + \
+            trunc((sizes['bin'][notinarc] + sizes['bin'][inarc]) / 1000000), file_table.count('bin')) + \
                                  "    Impact:  Binary files not analysed by standard scan, will impact Capacity license usage\n" + \
                                  "    Action:  Remove files or ignore folders (using .bdignore files), also consider zipping\n" + \
                                  "             files and using Binary scan (See report file produced with -r option)\n\n"
 
-    binzip_list = {bin.split("##")[0] for bin in
-                   bin_list}  # if '##' isn't found, the whole string is still in idx 0 of output
-    if len(binzip_list) > 1:
-        bin_pack_name = pack_binaries(binzip_list)
-    elif len(binzip_list) > 0:
-        bin_pack_name = binzip_list.pop()
-    else:
+    binzip_list = file_table.outer_paths('bin')
+    num_binaries = len(binzip_list)
+    triage_stats = None
+    bin_volumes = []
+    # Only triage the binaries and build the pack when BDBA will be invoked
+    if binary_matching_actionable.evaluate(sensitivity=args.sensitivity, num_binaries=num_binaries,
+                                           bin_pack_name="", no_write=False,
+                                           bdba_enable=args.binary).outcome == "NO-OP":
         bin_pack_name = None
-    result = binary_matching_actionable.test(sensitivity=args.sensitivity, num_binaries=len(binzip_list),
+    else:
+        # Send the binaries with most analysis value (within --bdba_budget)
+        binzip_list, triage_stats = select_binaries(binzip_list)
+        num_binaries = len(binzip_list)
+        if num_binaries > 1:
+            bin_volumes = pack_binaries(binzip_list)
+            bin_pack_name = bin_volumes[0] if bin_volumes else None
+        elif num_binaries == 1:
+            bin_pack_name = binzip_list.pop()
+        else:
+            bin_pack_name = None
+    result = binary_matching_actionable.test(sensitivity=args.sensitivity, num_binaries=num_binaries,
                                              bin_pack_name=bin_pack_name, no_write=False, bdba_enable=args.binary)
     if result.outcome != "NO-OP":
-        c.str_add('size', result.outcome)
+        if len(bin_volumes) > 1:
+            # Detect finds all of the volumes by name pattern
+            from detect_wizard_src.BinaryPack import BinaryPack
+            c.str_add('size', "detect.binary.scan.file.name.patterns: " +
+                      BinaryPack(args.scanfolder).volume_pattern())
+        else:
+            c.str_add('size', result.outcome)
 
     if size_dirdups > 20000000:
         pass
@@ -1230,6 +2036,9 @@ def signature_process(folder, f):
             c.str_add('lic', "--detect.blackduck.signature.scanner.upload.source.mode=true")
             c.str_add('lic', "    (CAUTION - will upload local source files)")
 
+    if args.sig_budget and not sig_scan_excluded:
+        sig_budget_process()
+
     check_singlefiles(f)
     result = indiv_file_match_actionable.test(sensitivity=args.sensitivity)
     if result.outcome != "NO-OP":
@@ -1240,13 +2049,86 @@ def signature_process(folder, f):
         c.str_add('scan', result.outcome)
 
     print(" Done")
+    if triage_stats is not None:
+        print(triage_stats[1])
+        print(triage_stats[0])
+    if binpack_stats:
+        print(binpack_stats)
     print("")
     return use_json_splitter
 
 
-def detector_process(folder, f):
-    import shutil
+def sig_budget_process():
+    # Choose folders to exclude from the signature scan to bring the projected scan size within --sig_budget
+    from detect_wizard_src.SigBudget import SigBudget, name_category
+    global sig_budget
+
+    projected = sizes['file'][notinarc] + sizes['arc'][notinarc]
+    budget = int(args.sig_budget * 1000000)
+    sig_budget = SigBudget(budget)
+    # Duplicate folder -> the folder it duplicates (which is still scanned)
+    originals = {dup: orig for orig, dup in dup_dir_dict.items() if dup.find("##") < 0}
+    candidates = []
+    if projected > budget:
+        size_index.rollup()
+        for path in size_index.folders:
+            if path == args.scanfolder or path.find("##") >= 0:
+                continue
+            dsizes = size_index.sizes(path)
+            total = size_index.total(path)
+            if dsizes['binary'] == total:
+                category = 'binary'
+            elif path in originals:
+                category = 'duplicate'
+            else:
+                # Folders within generated or test folders take the category of the outermost one
+                category = 'other'
+                for name in os.path.relpath(path, args.scanfolder).split(os.sep):
+                    if name_category(name) is not None:
+                        category = name_category(name)
+                        break
+            value = dsizes['source'] + dsizes['jar'] + (dsizes['archive'] + dsizes['other']) / 10
+            candidates.append((path, category, total, value))
+    sig_budget.plan(candidates, projected, originals)
+
+    if sig_budget.chosen:
+        c.str_add('size', "detect.excluded.directories: '{}'".format(
+            ",".join(sig_budget.patterns(args.scanfolder))), should_update=True)
+        c.str_add('size', "    (--sig_budget exclusions reducing the signature scan from {:,d} MB to {:,d} MB - "
+                          "also excluded from the detector search)".format(trunc(b_to_mb(projected)),
+                                                                          trunc(b_to_mb(sig_budget.remaining))))
+    if sig_budget.remaining <= budget:
+        if sig_budget.chosen:
+            recs_msgs_dict['info'] += "- INFORMATION: Signature scan size ({:,d} MB) reduced to {:,d} MB to meet --sig_budget ({:,d} MB) by excluding {} folders\n".format(
+                trunc(b_to_mb(projected)), trunc(b_to_mb(sig_budget.remaining)), trunc(b_to_mb(budget)),
+                len(sig_budget.chosen)) + \
+                                      "    Impact:  Excluded folders are not signature scanned (duplicate, binary, generated and test/sample folders are excluded first)\n" + \
+                                      "    Action:  Review the detect.excluded.directories property in the project config file (savings by folder in the summary)\n\n"
+    else:
+        recs_msgs_dict['imp'] += "- IMPORTANT: Signature scan size ({:,d} MB) cannot be reduced to --sig_budget ({:,d} MB) by excluding folders ({:,d} MB after exclusions)\n".format(
+            trunc(b_to_mb(projected)), trunc(b_to_mb(budget)), trunc(b_to_mb(sig_budget.remaining))) + \
+                                 "    Impact:  Will impact Capacity license usage\n" + \
+                                 "    Action:  Remove large files from the project folder or scan sub-folders separately\n\n"
+
 
+def sig_budget_report():
+    # Savings of each --sig_budget exclusion, largest first
+    if sig_budget is None or not sig_budget.chosen:
+        return ""
+    report = "\nSIGNATURE SCAN BUDGET ({:,d} MB) - projected scan size {:,d} MB reduced to {:,d} MB:\n".format(
+        trunc(b_to_mb(sig_budget.budget)), trunc(b_to_mb(sig_budget.projected)), trunc(b_to_mb(sig_budget.remaining))) + \
+        "{:>10} {:>10} {:>10}   {:<12} {}\n".format("Saved MB", "Source MB", "Jar MB", "Category", "Excluded folder")
+    for path, category, size, value in sorted(sig_budget.chosen, key=lambda cand: (-cand[2], cand[0])):
+        dsizes = size_index.sizes(path)
+        report += "{:>10,d} {:>10,d} {:>10,d}   {:<12} {}\n".format(
+            trunc(b_to_mb(size)), trunc(b_to_mb(dsizes['source'])), trunc(b_to_mb(dsizes['jar'])), category,
+            os.path.relpath(path, args.scanfolder).replace(os.sep, '/'))
+    return report
+
+
+def detector_process(folder, f):
+    from detect_wizard_src.ToolIndex import ToolIndex
+    global tool_index
     global rep
     global det_max_depth
     global det_min_depth
@@ -1266,6 +2148,9 @@ def detector_process(folder, f):
     det_max_depth = 0
     det_min_depth = 100
     det_in_arc = 0
+    # The PATH is listed once for all package manager executables
+    tool_index = ToolIndex({exe for exes in list(detectors_file_dict.values()) + list(detectors_ext_dict.values())
+                            for exe in exes})
     if len(det_dict) > 0:
         for detpath, depth in det_dict.items():
             command_exists = False
@@ -1289,6 +2174,7 @@ def detector_process(folder, f):
                     exes = detectors_ext_dict[os.path.splitext(fname)[1]]
                 missing_cmds = ""
                 for exe in exes:
+                    tool_files[exe] += 1
                     if exe not in detectors_list:
                         detectors_list.append(exe)
                         if platform.system() != "Linux" and exe in linux_only_detectors:
@@ -1304,7 +2190,7 @@ def detector_process(folder, f):
                                     exe) + \
                                               "    Impact:  Scan may fail if detector depth changed from default value 0\n" + \
                                               "    Action:  Re-run Detect scan on Linux\n\n"
-                    if shutil.which(exe) is not None:
+                    if tool_index.which(exe) is not None:
                         command_exists = True
                     else:
                         if exe not in cmds_missing_list:
@@ -1407,11 +2293,36 @@ def detector_process(folder, f):
             for prop in detector_cli_required_dict[cmd].splitlines(keepends=False):
                 c.str_add('dep', prop, is_commented=True)
 
+    # Versions of the package manager tools found are probed while the scan analysis continues
+    prereq_probes.start(tool_version_probes())
+
     print(" Done")
 
     return
 
 
+def tool_version_probes():
+    # Prerequisite probe names for the versions of the package manager tools found
+    return ['version:' + tool_index.which(exe) for exe in detectors_list if tool_index.which(exe) is not None]
+
+
+def tool_report():
+    # Package manager tools required by the config files found - location and version (versions not known
+    # within tool_version_wait seconds are not waited for)
+    if not detectors_list:
+        return ""
+    versions = prereq_probes.completed(tool_version_probes(), tool_version_wait)
+    report = "\nPACKAGE MANAGER TOOLS:\n{:<12} {:>12}   {:<40} {}\n".format("Tool", "Config Files", "Location",
+                                                                          "Version")
+    for exe in detectors_list:
+        location = tool_index.which(exe)
+        version = ""
+        if location:
+            version = versions.get('version:' + location, "(still being checked)")[:60]
+        report += "{:<12} {:>12,d}   {:<40} {}\n".format(exe, tool_files[exe], location or "NOT FOUND", version)
+    return report
+
+
 def output_recs(critical_only, f):
     global messages
 
@@ -1463,8 +2374,8 @@ def output_recs(critical_only, f):
     if len(bdignore_list) > 0 and f:
         f.write(
             "\nFOLDERS WHICH COULD BE IGNORED:\n(Multiple .bdignore files must be created in sub-folders - folder names must use /folder/ pattern)\n\n")
-        for bpath in bdignore_list:
-            f.write(bpath)
+        for bpath, bsize in plan_bdignores(bdignore_list, args.scanfolder, dir_dict, large_dict):
+            f.write("{:>12,d} MB   {}\n".format(trunc(b_to_mb(bsize)), bpath))
 
 
 def check_prereqs():
@@ -1484,10 +2395,10 @@ def check_prereqs():
         #                 "    (If Java installed, specify path to java executable if not on PATH)\n"
         else:
             try:
-                javaoutput = subprocess.check_output(['java', '-version'], stderr=subprocess.STDOUT)
+                javaoutput = prereq_probes.result('java')
                 crit = True
                 if javaoutput:
-                    line0 = javaoutput.decode("utf-8").splitlines()[0]
+                    line0 = javaoutput.splitlines()[0]
                     prog = line0.split(" ")[0].lower()
                     if prog:
                         version_string = line0.split('"')[1]
@@ -1547,12 +2458,19 @@ def check_prereqs():
     else:
         os_platform = "win"
 
-    if shutil.which("curl") is None:
+    if args.detect_cache:
+        cache_detect_jar()
+    if detect_jar is not None:
+        cli_msgs_dict['detect'] = " java -jar \"{}\"\n".format(detect_jar)
+        c.str_add('detect', cli_msgs_dict['detect'], is_commented=True)
+        c.str_add('detect', "    (Detect {} jar from the local Detect cache)".format(
+            args.detect_version), is_commented=True)
+    elif shutil.which("curl") is None:
         recs_msgs_dict['crit'] += "- CRITICAL: Curl is not installed or on the PATH\n" + \
                                   "    Impact:  Detect program will fail\n" + \
                                   "    Action:  Install Curl or add to PATH\n\n"
     else:
-        if not check_connection("https://detect.synopsys.com"):
+        if not check_connection(prereq_urls[0]):
             recs_msgs_dict['crit'] += "- CRITICAL: No connection to https://detect.synopsys.com\n" + \
                                       "    Impact:  Detect wrapper script cannot be downloaded, Detect cannot be started\n" + \
                                       "    Action:  Either configure proxy (See CLI section) or download Detect manually and run offline (see docs)\n\n"
@@ -1562,20 +2480,30 @@ def check_prereqs():
         else:
             cli_msgs_dict['detect'] = cli_msgs_dict["detect_" + os_platform]
             c.str_add('detect', cli_msgs_dict["detect_" + os_platform], is_commented=True)
-            if not check_connection("https://sig-repo.synopsys.com"):
+            if not check_connection(prereq_urls[1]):
                 recs_msgs_dict['crit'] += "- CRITICAL: No connection to https://sig-repo.synopsys.com\n" + \
                                           "    Impact:  Detect jar cannot be downloaded; Detect cannot run\n" + \
                                           "    Action:  Either configure proxy (See CLI section) or download Detect manually and run offline (see docs)\n\n"
 
 
-def check_connection(url):
-    import subprocess
-
+def cache_detect_jar():
+    # Make sure the --detect_version jar is in the --detect_cache cache - Detect is run from it if so
+    global detect_cache
+    global detect_jar
+    from detect_wizard_src.DetectCache import DetectCache
     try:
-        output = subprocess.check_output(['curl', '-s', '-m', '5', url], stderr=subprocess.STDOUT)
-        return True
-    except:
-        return False
+        detect_cache = DetectCache(args.detect_cache, args.detect_repo)
+        detect_jar = detect_cache.ensure(args.detect_version)
+    except (OSError, ValueError) as e:
+        print("WARNING: Unable to cache Detect {} in '{}' ({}) - Detect script will be used".format(
+            args.detect_version, args.detect_cache, e))
+        detect_cache = None
+        detect_jar = None
+
+
+def check_connection(url):
+    # Result of the background connection check for url (started now if it was not started with the scan)
+    return prereq_probes.result('connection:' + url)
 
 
 def check_docker_prereqs():
@@ -1592,9 +2520,7 @@ def check_docker_prereqs():
                                       "    Impact:  Docker image scan will fail\n" + \
                                       "    Action:  Install docker\n\n"
         else:
-            try:
-                output = subprocess.check_output(['docker', 'run', 'hello-world'], stderr=subprocess.STDOUT)
-            except:
+            if not prereq_probes.result('docker'):
                 recs_msgs_dict['crit'] += "- CRITICAL: Docker could not be started\n" + \
                                           "    Impact:  Detect image scan will fail (docker inspector cannot be started)\n" + \
                                           "    Action:  Check docker permissions OR not running within container\n\n"
@@ -1666,70 +2592,29 @@ def output_cli(critical_only, report, f):
 
 
 def create_bdignores():
-    filecount = 0
-    foldercount = 0
-
-    for bdpath in bdignore_list:
-        bdignore_file = os.path.join(os.path.dirname(bdpath), ".bdignore")
-        if not os.path.exists(bdignore_file):
-            try:
-                b = open(bdignore_file, "a")
-                b.write("/" + os.path.basename(bdpath) + "/\n")
-                b.close()
-                # print("INFO: '.bdignore' file created in project folder")
-                filecount += 1
-            except Exception as e:
-                print('ERROR: Unable to create .bdignore file\n' + str(e))
-        else:
-            # Check whether entry exists
-            try:
-                b = open(bdignore_file, "r")
-                lines = b.readlines()
-                exists = False
-                for line in lines:
-                    if line == "/" + os.path.basename(bdpath) + "/\n":
-                        exists = True
-                b.close()
-                if not exists:
-                    b = open(bdignore_file, "a")
-                    b.write("/" + os.path.basename(bdpath) + "/\n")
-                    b.close()
-            except Exception as e:
-                print('ERROR: Unable to update .bdignore file\n' + str(e))
-        foldercount += 1
-    print("INFO: Created/updated {} .bdignore files to ignore {} folders\n".format(filecount, foldercount))
+    # Duplicate and binary-only folders are collapsed to the fewest entries and written once per .bdignore file
+    plan = plan_bdignores(bdignore_list, args.scanfolder, dir_dict, large_dict)
+    filecount, entrycount, errors = write_bdignores(plan)
+    for error in errors:
+        print('ERROR: ' + error)
+    if plan:
+        print("\nFOLDERS IGNORED BY .bdignore ENTRIES (scan size saved by each):")
+        for bpath, bsize in sorted(plan, key=lambda entry: (-entry[1], entry[0])):
+            print("{:>12,d} MB   {}".format(trunc(b_to_mb(bsize)), bpath))
+        print()
+    print("INFO: Created/updated {} .bdignore files to ignore {} folders ({} new entries, {:,d} MB excluded from scan)\n".format(
+        filecount, len(plan), entrycount, trunc(b_to_mb(sum(size for path, size in plan)))))
 
 
 def output_config(conffile, c):
-    # config_file = os.path.join(projdir, "application-project.yml")
-    # config_file = os.path.join(os.getcwd(), conffile)
-    # config_file = os.path "application-project.yml")
-    if not os.path.exists(conffile):
-        config = "#\n# EXAMPLE PROJECT CONFIG FILE\n" + \
-                 "# Uncomment and update required options\n#\n#\n" + \
-                 "# DETECT COMMAND TO RUN:\n#\n" + cli_msgs_dict['detect'] + "\n" + \
-                 "# MINIMUM REQUIRED OPTIONS:\n#\n" + cli_msgs_dict['reqd'] + "\n" + \
-                 "# OPTIONS TO IMPROVE SCAN COVERAGE:\n#\n" + cli_msgs_dict['scan'] + "\n" + \
-                 "# OPTIONS TO REDUCE SIGNATURE SCAN SIZE:\n#\n" + cli_msgs_dict['size'] + "\n" + \
-                 "# OPTIONS TO CONFIGURE DEPENDENCY SCAN:\n#\n" + cli_msgs_dict['dep'] + "\n" + \
-                 "# OPTIONS TO IMPROVE LICENSE COMPLIANCE ANALYSIS:\n#\n" + cli_msgs_dict['lic'] + "\n" + \
-                 "# PROJECT OPTIONS:\n#\n" + cli_msgs_dict['proj'] + "\n" + \
-                 "# REPORTING OPTIONS:\n#\n" + cli_msgs_dict['rep'] + "\n" + \
-                 "# DOCKER SCANNING:\n#\n" + cli_msgs_dict['docker'] + "\n"
-
-        config = re.sub("=", ": ", config)
-        config = re.sub(r"\n ", r"\n#", config, flags=re.S)
-        config = re.sub(r"\n--", r"\n#", config, flags=re.S)
-        try:
-            cf = open(conffile, "a")
-            cf.write(str(c)) # Writes new config file instead of old.
-            cf.close()
-        #             print("INFO: Config file 'application-project.yml' file written to project folder (Edit to uncomment options)\n" + \
-        #             "      - Use '--spring.profiles.active=project' to specify this configuration")
-        except Exception as e:
-            print('ERROR: Unable to create project config file ' + str(e))
-    else:
-        print("INFO: Project config file 'application-project.yml' already exists - not updated")
+    # Existing config file content is merged into c when it is created, so only write if something changed
+    try:
+        if c.write(conffile):
+            print("INFO: Project config file '{}' written".format(conffile))
+        else:
+            print("INFO: Project config file '{}' unchanged - not updated".format(conffile))
+    except Exception as e:
+        print('ERROR: Unable to create project config file ' + str(e))
 
 
 def get_input_yn(prompt, default):
@@ -2025,60 +2910,87 @@ def generate_detect_config(config_file):
 
     if use_json_splitter:
         c.str_add('size', 'blackduck.offline.mode: true', is_commented=False)
-        c.str_add('size', 'detect.bom.aggregate.name: detect_advisor_run_{}'.format(datetime.now()), is_commented=False)
+        c.str_add('size', 'detect.bom.aggregate.name: {}'.format(aggregate_name()), is_commented=False)
 
-    with open(config_file, 'w') as f:
-        f.writelines(str(c))
 
+def aggregate_name():
+    # BOM aggregate file name for split scans - the same on every run (from the Black Duck project and version, or
+    # the project folder name) so that the generated config only changes when the scan does
+    if args.hub_project is not None and args.hub_project != "None":
+        name = args.hub_project
+        if args.hub_version is not None and args.hub_version != "None":
+            name += "_" + args.hub_version
+    else:
+        name = os.path.basename(os.path.abspath(args.scanfolder))
+    return "detect_advisor_run_" + re.sub(r'[^A-Za-z0-9._-]', '_', name)
 
-def file_tree_string(start_path, max_depth=10):
-    return (p.displayable() for p in PathTree.make_tree(start_path, max_depth=max_depth))
 
+def run_detect(config_file, detect_args=()):
+    # Returns the overall status reported by Detect (None if not found) - detect_args are added to the command
+    from detect_wizard_src.DetectPhases import DetectPhases
 
-def run_detect(config_file):
+    phases = DetectPhases()
 
     detect_command = c['detect'].get_line(1).strip() + ' ' \
                      + '--spring.profiles.active=project' + ' ' \
-                     + ' --spring.config.location="file:' + config_file + '"'
-
-    print("Running command: {}\n".format(detect_command))
-    if platform.system() == "Windows":
+                     + ' --spring.config.location="file:' + config_file + '"' \
+                     + ''.join(' ' + arg for arg in detect_args)
+
+    if detect_jar is not None:
+        # The cached jar is checked again in case it has changed since check_prereqs()
+        if not detect_cache.verify(args.detect_version):
+            print("ERROR: Cached Detect jar '{}' failed its integrity check - Detect not run".format(detect_jar))
+            return None
+        detect_command = ["java", "-jar", detect_jar, "--spring.profiles.active=project",
+                          "--spring.config.location=file:" + config_file] + list(detect_args)
+        print("Running command: {}\n".format(" ".join(detect_command)))
+        p = subprocess.Popen(detect_command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    elif platform.system() == "Windows":
+        print("Running command: {}\n".format(detect_command))
         detect_command = 'powershell "[Net.ServicePointManager]::SecurityProtocol = \'tls12\'; irm https://detect.synopsys.com/detect.ps1?$(Get-Random) | iex; detect"' + ' ' \
                      + '--spring.profiles.active=project' + ' ' \
-                     + ' --spring.config.location="file:' + config_file + '"'
+                     + ' --spring.config.location="file:' + config_file + '"' \
+                     + ''.join(' ' + arg for arg in detect_args)
 
         p = subprocess.Popen(["powershell.exe",
                               detect_command],
                              stdout=subprocess.PIPE)
     else:
+        print("Running command: {}\n".format(detect_command))
         p = subprocess.Popen(detect_command, shell=True, executable='/bin/bash', stdout=subprocess.PIPE,
                              stderr=subprocess.STDOUT)
-    stdout = p.stdout
+
+    from detect_wizard_src.DetectOutput import DetectOutput
+
+    def announce(field, value):
+        # Called from the output pump as soon as a field is seen
+        if field == 'run_directory' and use_json_splitter:
+            print("JSON splitter will upload the scan files in {} when Detect exits".format(value))
+
     with open(os.path.join(args.scanfolder, 'latest_detect_run.txt'), "w+") as out_file:
         out_file.write(Actionable.wl.make_table(args.sensitivity))
-        while True:
-            std_out_output = stdout.readline()
-            if std_out_output == '' or re.findall(r'Result code of [0-9]*, exiting', std_out_output.decode('utf-8')):
-                break
-            if std_out_output:
-                out_file.write(std_out_output.decode('utf-8'))
-                print(std_out_output.decode('utf-8').strip())
+        output = DetectOutput(p.stdout, out_file)
+        output.add_listener(announce)
+        output.add_listener(phases.listener)
+        output.start()
+        output.wait()
+        p.wait()
+        phases.finish()
+        out_file.write(phases.report())
 
-    with open(os.path.join(args.scanfolder, 'latest_detect_run.txt'), "r") as out_file:
-        file_contents = out_file.read()
+    print(phases.report())
+    phases.write(os.path.join(args.scanfolder, 'latest_detect_phases.json'))
 
-    detect_status = re.search(r'Overall Status: (.*)\n', file_contents)
-    bom_location = re.search(r'Black Duck Project BOM: (.*)\n', file_contents)
+    detect_status = output.get('status')
+    bom_location = output.get('bom')
 
     if use_json_splitter:
         print("Using JSON splitter")
         # upload scan files
 
-        match = re.search(r'Run directory: (.*)\n', file_contents)
-        output_directory = None
+        output_directory = output.get('run_directory')
 
-        if match:
-            output_directory = match.group(1)
+        if output_directory:
             json_files = glob.glob('{}/scan/BlackDuckScanOutput/*/data/*.json'.format(output_directory))
             bdio_files = glob.glob('{}/bdio/*.jsonld'.format(output_directory))
             if bdio_files:
@@ -2091,6 +3003,7 @@ def run_detect(config_file):
             with open('.restconfig.json', 'w') as f:
                 json_data = {"baseurl": args.url, "api_token": args.api_token, "insecure": args.trust_cert, "debug": False}
                 json.dump(json_data, f)
+            from blackduck.HubRestApi import HubInstance
             hub = HubInstance()
             print("Will upload 1 bdio file and {} json files".format(str(len(json_lst))))
             hub.upload_scan(bdio_file)
@@ -2106,28 +3019,88 @@ def run_detect(config_file):
             print("Output directory could not be located. Dry run and BDIO files were not uploaded.")
 
     print("Detect logs written to: {}".format(out_file.name))
+    print("Detect phase timings written to: {}".format(os.path.join(args.scanfolder, 'latest_detect_phases.json')))
     if detect_status:
-        print("Detect run complete. Overall status: {}".format(detect_status.group(1)))
+        print("Detect run complete. Overall status: {}".format(detect_status))
     else:
         print("Detect run complete. Status could not be found. Please check logs for potential errors.")
 
     if bom_location:
-        print("BOM location: {}".format(bom_location.group(1)))
+        print("BOM location: {}".format(bom_location))
+    return detect_status
+
+
+def scan_fingerprint(conffile):
+    # Fingerprint of the project folder and the generated config for --skip_unchanged
+    import hashlib
+    with open(conffile, "rb") as cf:
+        config_digest = hashlib.sha256(cf.read()).hexdigest()
+    return {'tree': tree_fingerprint.digest(), 'files': tree_fingerprint.count, 'config': config_digest}
+
+
+def read_fingerprint_record():
+    try:
+        with open(os.path.join(args.scanfolder, 'detect_wizard_fingerprint.json'), "r") as r:
+            record = json.load(r)
+    except (OSError, ValueError):
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def write_fingerprint_record(fingerprint, status):
+    # Record the fingerprint of a completed Detect run in the project folder
+    import tempfile
+    record = dict(fingerprint, status=status, time=datetime.now().isoformat(timespec='seconds'))
+    fname = os.path.join(args.scanfolder, 'detect_wizard_fingerprint.json')
+    try:
+        fd, tmpname = tempfile.mkstemp(dir=args.scanfolder, prefix=".fingerprint-")
+        with os.fdopen(fd, "w") as r:
+            json.dump(record, r, indent=2)
+        os.replace(tmpname, fname)
+    except OSError as e:
+        print("WARNING: Unable to write Detect run record '{}' ({})".format(fname, e))
+
+
+def unchanged_since_last_run(fingerprint):
+    # Returns (unchanged, reason) comparing fingerprint with the record of the last completed Detect run
+    record = read_fingerprint_record()
+    if record is None:
+        return False, "no record of a completed Detect run for this project folder"
+    changes = []
+    if record.get('tree') != fingerprint['tree']:
+        changes.append("project folder changed ({:,d} files, {:,d} at the last run)".format(
+            fingerprint['files'], record.get('files', 0)))
+    if record.get('config') != fingerprint['config']:
+        changes.append("project config changed")
+    if changes:
+        return False, "{} since the Detect run at {}".format(" and ".join(changes), record.get('time'))
+    return True, "project folder ({:,d} files) and config unchanged since the Detect run at {} (status {})".format(
+        fingerprint['files'], record.get('time'), record.get('status'))
 
 
 @atexit.register
 def cleanup():
     global binpack
-    try:
-        if binpack is not None:
-            os.remove(binpack)  # clean up binary zip archive
-    except:
-        pass
+    for vol in binpack or []:
+        try:
+            os.remove(vol)  # clean up binary zip archive
+        except:
+            pass
+    if scan_store is not None:
+        scan_store.close()
 
 
 def run():
 
+    global args
     global c
+    global git_index
+    global file_records
+    global content_cache
+    global prereq_probes
+    global detect_output_dirs
+
+    args = parser.parse_args()
 
     if os.environ.get('BLACKDUCK_URL') != "" and args.url is None:
         args.url = os.environ.get('BLACKDUCK_URL')
@@ -2160,23 +3133,14 @@ def run():
         print("Black Duck server URL and API token are required\nExiting")
         sys.exit(1)
 
-    with open(os.path.join(args.scanfolder, 'detect_wizard_input.log'), "w+") as input_log_file:
-        input_log_file.write("Scan Dir: {}\n".format(args.scanfolder))
-        input_log_file.write("Sensitivity: {}\n".format(args.sensitivity))
-        input_log_file.write("Focus: {}\n".format(args.focus))
-        input_log_file.write("Trust cert: {}\n".format(str(args.trust_cert)))
-        input_log_file.write("\nScan Folder File Tree --\n")
-        for line in file_tree_string(args.scanfolder, 6):
-            log_file_size = b_to_gb(os.fstat(input_log_file.fileno()).st_size)
-            if log_file_size <= 1:
-                input_log_file.write(line + "\n")
-                input_log_file.flush()
-            else:
-                input_log_file.write("----> INPUT LOG FILE TRUNCATED FOR REACHING 1 GB. <----\n")
-                break
+    input_log_file = open(os.path.join(args.scanfolder, 'detect_wizard_input.log'), "w+")
+    input_log_file.write("Scan Dir: {}\n".format(args.scanfolder))
+    input_log_file.write("Sensitivity: {}\n".format(args.sensitivity))
+    input_log_file.write("Focus: {}\n".format(args.focus))
+    input_log_file.write("Trust cert: {}\n".format(str(args.trust_cert)))
+    input_log_file.write("\nScan Folder File Tree --\n")
 
     conffile = os.path.join(args.scanfolder, "application-project.yml")
-    backup = backup_file(conffile, "project config")
     c = Configuration(conffile, [PropertyGroup('detect', 'DETECT COMMAND TO RUN'),
                                  PropertyGroup('reqd', 'MINIMUM REQUIRED OPTIONS'),
                                  PropertyGroup('scan', 'OPTIONS TO IMPROVE SCAN COVERAGE'),
@@ -2240,9 +3204,70 @@ def run():
         print("Working on project folder '{}' (Absolute path '{}')\n".format(args.scanfolder,
                                                                              os.path.abspath(args.scanfolder)))
 
-    print("- Reading hierarchy          ..... ", end="", flush=True)
-    process_dir(args.scanfolder, 0, False)
-    print("Done")
+    # Prerequisite checks run in the background while the project folder is read
+    from detect_wizard_src.PrereqProbes import PrereqProbes
+    prereq_probes = PrereqProbes(os.path.join(os.path.expanduser("~"), ".detect_wizard", "prereqs.json"),
+                                 args.prereq_ttl)
+    prereq_probes.start(['java'] + ['connection:' + url for url in prereq_urls])
+
+    if args.git:
+        git_index = GitIndex.open(args.scanfolder)
+        if git_index is None:
+            print("WARNING: --git specified but no readable git index found for '{}' - files will be compared by content".format(
+                args.scanfolder))
+
+    if args.cache_dir:
+        try:
+            content_cache = ContentCache(args.cache_dir, args.cache_max_size * 1000000, args.cache_max_age * 86400)
+        except OSError as e:
+            print("WARNING: Unable to use cache folder '{}' ({}) - cache not used".format(args.cache_dir, e))
+
+    baseline = None
+    if args.save_baseline or args.baseline:
+        file_records = PrefixDict()
+    if args.baseline and args.changed_paths is not None:
+        try:
+            baseline = load_baseline(args.baseline)
+        except (OSError, ValueError) as e:
+            print("WARNING: Unable to load baseline '{}' ({}) - full scan will be performed".format(args.baseline, e))
+        else:
+            if baseline['scanfolder'] != os.path.abspath(args.scanfolder):
+                print("WARNING: Baseline '{}' was saved for project folder '{}' - full scan will be performed".format(
+                    args.baseline, baseline['scanfolder']))
+                baseline = None
+            elif baseline.get('expand_archives') != args.expand_archives:
+                print("WARNING: Baseline '{}' was saved with a different --expand_archives setting - full scan will be performed".format(
+                    args.baseline))
+                baseline = None
+    elif args.baseline or args.changed_paths is not None:
+        print("WARNING: --baseline and --changed_paths must be used together - full scan will be performed")
+
+    detect_output_dirs = detect_output_folders()
+    matcher = IgnoreMatcher.compile(args.scanfolder, ignored_files_and_directories, args.ignore)
+    if baseline is not None:
+        changed_paths = changed_walk_paths(args.scanfolder, read_changed_paths(args.changed_paths))
+        if changed_paths is None:
+            print("WARNING: Project folder listed in changed paths - full scan will be performed")
+            baseline = None
+    if baseline is not None:
+        print("- Reading changed paths      ..... ", end="", flush=True)
+        restore_baseline(baseline)
+        process_changed_paths(args.scanfolder, matcher, changed_paths)
+        input_log_file.write("(Not listed - {} changed paths applied to baseline {})\n".format(
+            len(changed_paths), args.baseline))
+        print("Done")
+    else:
+        print("- Reading hierarchy          ..... ", end="", flush=True)
+        # The file tree section of the input log is written from the same walk
+        tree_log = TreeLogWriter(input_log_file, 6)
+        tree_log.root(args.scanfolder)
+        process_dir(args.scanfolder, 0, matcher, tree_log)
+        tree_log.close()
+        print("Done")
+    input_log_file.close()
+
+    if args.save_baseline:
+        save_baseline(args.save_baseline, baseline_state())
 
     # if args.report:
     #    if os.path.exists(args.report):
@@ -2267,8 +3292,14 @@ def run():
     use_json_splitter = signature_process(args.scanfolder, f)
 
     print_summary(False, f)
+    if content_cache is not None:
+        content_cache.evict()
+
+    if args.what_if:
+        what_if_matrix(f)
 
     check_prereqs()
+    prereq_probes.close()
 
     #     if args.docker or args.docker_only:
     #         check_docker_prereqs()
@@ -2286,13 +3317,26 @@ def run():
     #conffile = os.path.join(args.scanfolder, "application-project.yml")
 
 
+    if not args.no_scan:
+        generate_detect_config(conffile)
     output_config(conffile, c)
     if not args.no_scan:
         # print out information on what the sensitivity setting is doing
-        generate_detect_config(conffile)
         config_file = conffile.replace(" ", "\ ")
         print(Actionable.wl.make_table(args.sensitivity))
-        run_detect(conffile)
+        fingerprint = scan_fingerprint(conffile)
+        unchanged, reason = unchanged_since_last_run(fingerprint) if args.skip_unchanged else (False, None)
+        if unchanged and args.skip_unchanged == 'detect':
+            print("INFO: Detect not run - {}".format(reason))
+        elif unchanged:
+            print("INFO: Signature and binary scans not run - {}".format(reason))
+            run_detect(conffile, ['--detect.tools.excluded=SIGNATURE_SCAN,BINARY_SCAN'])
+        else:
+            if reason:
+                print("INFO: Detect run required - {}".format(reason))
+            status = run_detect(conffile)
+            if status in detect_completed_statuses:
+                write_fingerprint_record(fingerprint, status)
 
     if args.bdignore:
         create_bdignores()
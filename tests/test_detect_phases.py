@@ -0,0 +1,110 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from detect_wizard_src.DetectOutput import DetectOutput
+from detect_wizard_src.DetectPhases import DetectPhases
+
+# Excerpt of the output of a Detect 8 run (seconds from the start of the run, line)
+detect_log = [
+    (0, "2023-05-10 10:00:00 INFO  [main] --- Detect Version: 8.9.0"),
+    (1, "2023-05-10 10:00:01 INFO  [main] --- Run directory: /home/user/blackduck/runs/2023-05-10-10-00-00-104"),
+    (2, "2023-05-10 10:00:02 INFO  [main] --- Source directory: /home/user/project"),
+    (5, "2023-05-10 10:00:05 INFO  [main] --- ----------------------------------"),
+    (5, "2023-05-10 10:00:05 INFO  [main] --- Detector Tool"),
+    (6, "2023-05-10 10:00:06 INFO  [main] --- Searching for detectors. This may take a while."),
+    (9, "2023-05-10 10:00:09 INFO  [main] --- Extracting 1 of 2 (50%)"),
+    (20, "2023-05-10 10:00:20 INFO  [main] --- Extracting 2 of 2 (100%)"),
+    (34, "2023-05-10 10:00:34 INFO  [main] --- Completed the Detector Tool."),
+    (35, "2023-05-10 10:00:35 INFO  [main] --- Will include the signature scanner tool."),
+    (35, "2023-05-10 10:00:35 INFO  [main] --- Starting the Black Duck Signature Scan."),
+    (125, "2023-05-10 10:02:05 INFO  [main] --- Completed the Black Duck Signature Scan."),
+    (126, "2023-05-10 10:02:06 INFO  [main] --- Uploading BDIO files."),
+    (130, "2023-05-10 10:02:10 INFO  [main] --- Waiting for the BOM to be updated with the scan results."),
+    (190, "2023-05-10 10:03:10 INFO  [main] --- Checking for policy violations."),
+    (195, "2023-05-10 10:03:15 INFO  [main] --- ======== Detect Result ========"),
+    (195, "2023-05-10 10:03:15 INFO  [main] --- Black Duck Project BOM: https://blackduck.example.com/api/projects/"
+          "3f0c/versions/81aa/components"),
+    (195, "2023-05-10 10:03:15 INFO  [main] --- ======== Detect Status ========"),
+    (195, "2023-05-10 10:03:15 INFO  [main] --- Signature scan / Snippet scan on /home/user/project: SUCCESS"),
+    (195, "2023-05-10 10:03:15 INFO  [main] --- Overall Status: SUCCESS - Detect exited successfully."),
+]
+# Seconds from the start of the run at which the Detect process exits
+exit_time = 196
+
+# (phase, start offset, seconds) expected from the excerpt
+expected_phases = [
+    ('Startup', 0, 5),
+    ('Detectors', 5, 30),
+    ('Signature scan', 35, 91),
+    ('Upload', 126, 4),
+    ('BOM wait', 130, 60),
+    ('Reports', 190, 5),
+    ('Results', 195, 1),
+]
+
+
+class LogStream(object):
+    # Process output stream which sets the clock to the time of each line as it is read
+    def __init__(self, clock, lines):
+        self.clock = clock
+        self.lines = iter(lines)
+
+    def readline(self):
+        for seconds, line in self.lines:
+            self.clock.now = seconds
+            return (line + "\n").encode('utf-8')
+        return b''
+
+
+class Clock(object):
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class DetectPhasesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch('detect_wizard_src.DetectPhases.time.monotonic', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.phases = DetectPhases()
+        self.output = DetectOutput(LogStream(self.clock, detect_log), io.StringIO(), echo=False)
+        self.output.add_listener(self.phases.listener)
+        self.output.pump()
+        self.clock.now = exit_time
+        self.phases.finish()
+
+    def test_phases(self):
+        self.assertEqual([(name, started, seconds) for name, (started, seconds, visits) in self.phases.phases.items()],
+                         expected_phases)
+        self.assertTrue(all(visits == 1 for started, seconds, visits in self.phases.phases.values()))
+        self.assertEqual(self.phases.total(), exit_time)
+        self.assertEqual(self.output.get('status'), "SUCCESS - Detect exited successfully.")
+
+    def test_report(self):
+        report = self.phases.report()
+        self.assertRegex(report, r"Signature scan\s+0:00:35\s+0:01:31\s+46\.4%\s+1")
+        self.assertRegex(report, r"Total\s+0:03:16")
+
+    def test_write(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'latest_detect_phases.json')
+            self.phases.write(path)
+            with open(path, "r") as f:
+                record = json.load(f)
+        self.assertRegex(record['started'], r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}")
+        self.assertEqual(record['total_seconds'], exit_time)
+        self.assertEqual(record['phases'], [{'phase': name, 'start_offset_seconds': started, 'seconds': seconds,
+                                             'visits': 1} for name, started, seconds in expected_phases])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budget (seconds) for importing detect_wizard_src.detect_wizard - the import takes about 0.08 s
+import_budget = 0.5
+# Modules which are only imported on the code paths that use them
+deferred_modules = ['magic', 'blackduck', 'texttable']
+
+import_script = """
+import json, sys, time
+start = time.perf_counter()
+import detect_wizard_src.detect_wizard
+print(json.dumps({'seconds': time.perf_counter() - start, 'modules': sorted(sys.modules)}))
+"""
+
+
+def import_wizard():
+    # Import the wizard module in a fresh interpreter - returns (seconds, loaded module names)
+    env = dict(os.environ, PYTHONPATH=repo_root)
+    result = subprocess.run([sys.executable, "-c", import_script], cwd=repo_root, env=env, capture_output=True,
+                            text=True, check=True)
+    record = json.loads(result.stdout.splitlines()[-1])
+    return record['seconds'], record['modules']
+
+
+class ImportTimeTest(unittest.TestCase):
+
+    def test_deferred_modules_not_imported(self):
+        seconds, modules = import_wizard()
+        for name in deferred_modules:
+            loaded = [module for module in modules if module == name or module.startswith(name + ".")]
+            self.assertEqual(loaded, [], "{} imported by detect_wizard_src.detect_wizard".format(name))
+
+    def test_import_within_budget(self):
+        # Best of a few imports, so that a busy host does not fail the test
+        seconds = min(import_wizard()[0] for _ in range(3))
+        self.assertLess(seconds, import_budget,
+                        "Import took {:.3f} s (budget {} s)".format(seconds, import_budget))
+
+
+if __name__ == "__main__":
+    unittest.main()